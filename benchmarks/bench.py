@@ -0,0 +1,324 @@
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+# Run from the repository root: python -m benchmarks.bench --output results.json
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src import generator, loss, montecarlo, simulator
+
+COORDINATES = (45.801509, 15.971139)
+RADIUS = 4000
+FREQUENCY = 2
+BANDWIDTH = 20.0
+
+PARAMS = {
+    "antenna_type": "macro",
+    "avg_building_height": 5.0,
+    "avg_street_width": 20.0,
+    "tx_height": 40.0,
+    "rx_height": 1.5,
+    "area_type": "urban",
+    "city_type": "large",
+
+    "tx_power": 46.0,
+    "tx_gain": 18.0,
+    "tx_losses": 2.0,
+
+    "rx_gain": 4.0,
+    "rx_losses": 1.0,
+}
+
+# Loss models timed by get_loss_object + compute_loss: name, frequency, constructor arguments
+LOSS_MODELS = [
+    ("okumura_hata_urban", 0.9, {"area_type": "urban", "city_type": "large"}),
+    ("okumura_hata_suburban", 0.9, {"area_type": "suburban", "city_type": "large"}),
+    ("okumura_hata_rural", 0.9, {"area_type": "rural", "city_type": "large"}),
+    ("etsi_urban_macro", 2, {"area_type": "urban", "antenna_type": "macro"}),
+    ("etsi_urban_micro", 2, {"area_type": "urban", "antenna_type": "micro"}),
+    ("etsi_rural_macro", 2, {"area_type": "rural", "antenna_type": "macro",
+                             "avg_building_height": 5.0, "avg_street_width": 20.0}),
+]
+
+# Receiver counts of the simulator benchmarks, the legacy loop is too slow
+# for the largest one and is timed there only with --full
+RECEIVERS = [20, 1000, 100000]
+LEGACY_RECEIVERS = [20, 1000]
+
+BENCHMARKS = []
+CLIENT = None
+
+
+"""
+Registers a benchmark: setup is called once, untimed, and returns
+the function which is timed
+"""
+
+def benchmark(name, group):
+    def register(setup):
+        BENCHMARKS.append({"name": name, "group": group, "setup": setup})
+        return setup
+    return register
+
+
+"""
+Times a function repeat times after one warm-up call, every sample runs
+the function number times and is divided by it
+
+Returns:
+    stats: dict with per-call min, max, mean, median and stdev in seconds
+"""
+
+def measure(function, repeat=5, number=1):
+    function()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - start) / number)
+
+    return {
+        "min": min(samples),
+        "max": max(samples),
+        "mean": statistics.mean(samples),
+        "median": statistics.median(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+"""
+Returns generate_data output for a grid of at least num_receivers points
+over the central site, with receivers cut to exactly num_receivers
+"""
+
+def receiver_data(num_receivers, receiver_geometry=True):
+    # About 65% of the grid over the site bounds lies inside the hexagon, 60% leaves a margin
+    side = int(math.ceil(math.sqrt(num_receivers / 0.6)))
+    data = generator.generate_data(COORDINATES, RADIUS, grid=True, num_receivers=side,
+                                   receiver_geometry=receiver_geometry)
+    data["receiver_coordinates"] = data["receiver_coordinates"][:num_receivers]
+    if receiver_geometry:
+        data["receivers"] = data["receivers"][:num_receivers]
+    return data
+
+
+for name, frequency, arguments in LOSS_MODELS:
+
+    @benchmark("loss.%s" % name, "loss")
+    def loss_setup(frequency=frequency, arguments=arguments):
+        distances = np.linspace(100.0, 5000.0, 50)
+
+        def run():
+            # Constructor arguments differ between models, unused ones are ignored
+            model = loss.get_loss_object(frequency, **arguments)
+            for distance in distances:
+                model.compute_loss(frequency, distance, 40.0, 1.5)
+        return run
+
+
+for num_receivers in RECEIVERS:
+
+    @benchmark("simulator.run_batch.%d" % num_receivers, "simulator")
+    def batch_setup(num_receivers=num_receivers):
+        data = receiver_data(num_receivers, receiver_geometry=False)
+        return lambda: simulator.Simulator(data, PARAMS).run_batch(FREQUENCY, BANDWIDTH)
+
+
+@benchmark("simulator.monte_carlo.1000", "simulator")
+def monte_carlo_setup():
+    data = receiver_data(1000, receiver_geometry=False)
+    return lambda: montecarlo.run_monte_carlo(simulator.Simulator(data, PARAMS), FREQUENCY, BANDWIDTH, trials=1000, seed=0)
+
+
+def register_legacy(receivers):
+    for num_receivers in receivers:
+
+        @benchmark("simulator.run.%d" % num_receivers, "simulator")
+        def run_setup(num_receivers=num_receivers):
+            data = receiver_data(num_receivers)
+            return lambda: simulator.Simulator(data, PARAMS).run(FREQUENCY, BANDWIDTH)
+
+
+@benchmark("generator.generate_data.line", "generator")
+def line_setup():
+    return lambda: generator.generate_data(COORDINATES, RADIUS)
+
+
+@benchmark("generator.generate_data.grid", "generator")
+def grid_setup():
+    return lambda: generator.generate_data(COORDINATES, RADIUS, grid=True, num_receivers=100)
+
+
+@benchmark("generator.generate_coordinates.grid", "generator")
+def coordinates_setup():
+    return lambda: generator.generate_coordinates(COORDINATES, RADIUS, grid=True, num_receivers=100)
+
+
+"""
+Returns Django test client shared by web benchmarks, Django is
+set up on first use so other groups run without it
+"""
+
+def web_client():
+    global CLIENT
+    if CLIENT is None:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "web.settings")
+        import django
+        django.setup()
+        from django.test import Client
+        from django.test.utils import setup_test_environment
+
+        setup_test_environment()
+        CLIENT = Client()
+    return CLIENT
+
+
+def web_setup(body):
+    client = web_client()
+    from django.core.cache import caches
+    from web import views
+
+    content = json.dumps(dict({
+        "frequency": str(FREQUENCY),
+        "bandwidth": str(BANDWIDTH),
+        "coordinates": list(COORDINATES),
+        "radius": str(RADIUS),
+    }, **{key: str(value) for key, value in PARAMS.items() if isinstance(value, float)}, **body))
+
+    def run(cached=False):
+        if not cached:
+            caches[views.RESULTS_CACHE].clear()
+        response = client.post("/api/results/", content, content_type="application/json")
+        if response.status_code != 200:
+            raise RuntimeError("results returned %d" % response.status_code)
+    return run
+
+
+@benchmark("web.results.json", "web")
+def web_json_setup():
+    return web_setup({})
+
+
+@benchmark("web.results.columnar", "web")
+def web_columnar_setup():
+    return web_setup({"format": "columnar"})
+
+
+@benchmark("web.results.cached", "web")
+def web_cached_setup():
+    run = web_setup({})
+    return lambda: run(cached=True)
+
+
+"""
+Returns commit the benchmarks are run on, None outside of a git checkout
+"""
+
+def git_revision():
+    try:
+        output = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+"""
+Runs selected benchmarks
+
+Parameters:
+    groups: benchmark groups to run, all by default
+    repeat: number of timed samples of every benchmark
+
+Returns:
+    report: dict with "metadata" and "benchmarks" keyed by name
+"""
+
+def run_benchmarks(groups=None, repeat=5):
+    results = {}
+
+    for entry in BENCHMARKS:
+        if groups and entry["group"] not in groups:
+            continue
+        function = entry["setup"]()
+        # Fast benchmarks are repeated within a sample to stay above timer resolution
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        number = max(1, min(1000, int(0.05 / max(elapsed, 1e-9))))
+        results[entry["name"]] = dict(measure(function, repeat=repeat, number=number), group=entry["group"])
+        print("%-40s %12.6f s" % (entry["name"], results[entry["name"]]["median"]), file=sys.stderr)
+
+    return {
+        "metadata": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "benchmarks": results,
+    }
+
+
+"""
+Compares medians of two reports, ratio above 1 means the current report is slower
+
+Returns:
+    comparison: dict of name -> (baseline median, current median, ratio)
+"""
+
+def compare(baseline, current):
+    comparison = {}
+    for name, stats in current["benchmarks"].items():
+        if name in baseline["benchmarks"]:
+            previous = baseline["benchmarks"][name]["median"]
+            comparison[name] = (previous, stats["median"], stats["median"] / previous)
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of loss models, simulator, generator and web endpoint")
+    parser.add_argument("--output", help="JSON file results are written to, standard output by default")
+    parser.add_argument("--group", action="append", choices=["loss", "simulator", "generator", "web"],
+                        help="run only given group, may be repeated")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed samples")
+    parser.add_argument("--full", action="store_true", help="also time the legacy Simulator.run at 100k receivers")
+    parser.add_argument("--compare", help="baseline JSON report to compare medians against")
+    args = parser.parse_args(argv)
+
+    register_legacy(RECEIVERS if args.full else LEGACY_RECEIVERS)
+    warnings.simplefilter("ignore")
+    report = run_benchmarks(args.group, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        for name, (previous, median, ratio) in compare(baseline, report).items():
+            print("%-40s %12.6f %12.6f %8.2fx" % (name, previous, median, ratio), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import argparse
+import configparser
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from generator import generate_coordinates
+from simulator import Simulator
+
+"""
+Headless batch runs of config.ini profiles for a file of sites
+
+Every site x profile combination is simulated on its own and its results
+are written out before the next one is started, so memory use does not
+grow with the number of sites.
+
+Usage:
+    python src/batch.py config.ini sites.csv results.csv --frequency 2 --bandwidth 20
+"""
+
+# config.ini keys and the simulator parameters they are read into
+PROFILE_KEYS = {
+    "cellRadius": "radius",
+    "areaType": "area_type",
+    "cityType": "city_type",
+    "antennaType": "antenna_type",
+    "antennaHeight": "tx_height",
+    "antennaGain": "tx_gain",
+    "antennaLosses": "tx_losses",
+    "antennaPower": "tx_power",
+    "receiverHeight": "rx_height",
+    "receiverGain": "rx_gain",
+    "receiverLosses": "rx_losses",
+    "avgBuildingHeight": "avg_building_height",
+    "avgStreetWidth": "avg_street_width",
+}
+
+TEXT_KEYS = ("area_type", "city_type", "antenna_type")
+
+# Columns of the written results, one row per receiver
+RESULT_COLUMNS = ("frequency", "bandwidth", "distance", "loss", "eirp", "received_power",
+                  "noise", "snr", "capacity", "interference_power", "sinr")
+OUTPUT_COLUMNS = ("site", "latitude", "longitude", "profile") + RESULT_COLUMNS
+
+# Rows buffered before a Parquet row group is written
+ROW_GROUP_SIZE = 65536
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 5.0
+
+LATITUDE_COLUMNS = ("latitude", "lat")
+LONGITUDE_COLUMNS = ("longitude", "lon", "lng")
+ID_COLUMNS = ("id", "site", "name")
+
+
+"""
+Loads simulation profiles from a config.ini file
+
+Parameters:
+    path: config file, every section is one profile
+    names: profiles to load, all by default
+
+Returns:
+    profiles: dict of profile name -> simulator params, the cell radius
+              is kept under "radius"
+"""
+
+def load_profiles(path, names=None):
+    parser = configparser.ConfigParser()
+    parser.optionxform = str    # Keys are case sensitive (cellRadius...)
+    if not parser.read(path):
+        raise ValueError("Cannot read config file %s" % path)
+
+    profiles = {}
+    for name in parser.sections():
+        if names and name not in names:
+            continue
+        params = {"avg_building_height": None, "avg_street_width": None}
+        for key, value in parser.items(name):
+            if key not in PROFILE_KEYS:
+                raise ValueError("Unknown key %s in profile %s" % (key, name))
+            param = PROFILE_KEYS[key]
+            params[param] = value if param in TEXT_KEYS else float(value)
+        profiles[name] = params
+
+    missing = set(names or []) - set(profiles)
+    if missing:
+        raise ValueError("Profiles not found in %s: %s" % (path, ", ".join(sorted(missing))))
+    return profiles
+
+
+"""
+Loads site coordinates from a CSV file with latitude and longitude columns,
+or from a GeoJSON file of Point features
+
+Returns:
+    sites: list of (site id, latitude, longitude)
+"""
+
+def load_sites(path):
+    if os.path.splitext(path)[1].lower() in (".geojson", ".json"):
+        return load_geojson_sites(path)
+    return load_csv_sites(path)
+
+
+def load_csv_sites(path):
+    with open(path, newline="") as file:
+        reader = csv.DictReader(file)
+        columns = {column.strip().lower(): column for column in reader.fieldnames or []}
+        latitude = _find_column(columns, LATITUDE_COLUMNS, path)
+        longitude = _find_column(columns, LONGITUDE_COLUMNS, path)
+        identifier = next((columns[name] for name in ID_COLUMNS if name in columns), None)
+
+        sites = []
+        for i, row in enumerate(reader):
+            site = row[identifier] if identifier else str(i)
+            sites.append((site, float(row[latitude]), float(row[longitude])))
+    return sites
+
+
+def load_geojson_sites(path):
+    with open(path) as file:
+        features = json.load(file).get("features", [])
+
+    sites = []
+    for i, feature in enumerate(features):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") != "Point":
+            continue
+        # GeoJSON coordinates are in (longitude, latitude) order
+        longitude, latitude = geometry["coordinates"][:2]
+        properties = feature.get("properties") or {}
+        site = feature.get("id", next((properties[name] for name in ID_COLUMNS if name in properties), i))
+        sites.append((str(site), float(latitude), float(longitude)))
+    return sites
+
+
+def _find_column(columns, names, path):
+    for name in names:
+        if name in columns:
+            return columns[name]
+    raise ValueError("%s has no %s column" % (path, " or ".join(names)))
+
+
+"""
+Simulates one site with one profile
+
+Returns:
+    columns: dict of OUTPUT_COLUMNS -> NumPy arrays, one row per receiver
+"""
+
+def run_site(site, profile_name, profile, frequency, bandwidth, grid=False, num_receivers=20, rings=1):
+    site_id, latitude, longitude = site
+    params = dict(profile)
+    radius = params.pop("radius")
+
+    data = generate_coordinates((latitude, longitude), radius, grid=grid, num_receivers=num_receivers, rings=rings)
+    results = Simulator(data, params).run_batch(frequency, bandwidth, columnar=True)
+    count = len(results["distance"])
+
+    columns = {
+        "site": np.full(count, site_id, dtype=object),
+        "latitude": np.full(count, latitude),
+        "longitude": np.full(count, longitude),
+        "profile": np.full(count, profile_name, dtype=object),
+    }
+    columns.update((key, results[key]) for key in RESULT_COLUMNS)
+    return columns
+
+
+"""
+Writes result columns to a CSV file as they arrive
+"""
+
+class CsvWriter(object):
+
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(OUTPUT_COLUMNS)
+
+    def write(self, columns):
+        self.writer.writerows(zip(*(columns[key] for key in OUTPUT_COLUMNS)))
+
+    def close(self):
+        self.file.close()
+
+
+"""
+Writes result columns to a Parquet file in row groups of about
+ROW_GROUP_SIZE rows, requires pyarrow
+"""
+
+class ParquetWriter(object):
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow, write CSV instead or install it")
+        self.pyarrow = pyarrow
+        self.path = path
+        self.writer = None
+        self.buffer = []
+        self.rows = 0
+
+    def write(self, columns):
+        self.buffer.append(columns)
+        self.rows += len(columns["distance"])
+        if self.rows >= ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        columns = {key: np.concatenate([part[key] for part in self.buffer]) for key in OUTPUT_COLUMNS}
+        table = self.pyarrow.table({key: columns[key].tolist() if columns[key].dtype == object else columns[key]
+                                    for key in OUTPUT_COLUMNS})
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+        self.buffer = []
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+"""
+Returns writer for the output file, Parquet for .parquet files and CSV otherwise
+"""
+
+def get_writer(path, output_format=None):
+    if output_format is None:
+        output_format = "parquet" if path.lower().endswith(".parquet") else "csv"
+    if output_format == "parquet":
+        return ParquetWriter(path)
+    return CsvWriter(path)
+
+
+"""
+Reports number of finished tasks and written rows with throughput
+to a stream at most every PROGRESS_INTERVAL seconds
+"""
+
+class Progress(object):
+
+    def __init__(self, total, stream=sys.stderr, interval=PROGRESS_INTERVAL):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.tasks = 0
+        self.rows = 0
+        self.start = time.perf_counter()
+        self.reported = self.start
+
+    def update(self, rows):
+        self.tasks += 1
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self.reported >= self.interval or self.tasks == self.total:
+            self.reported = now
+            self.report(now)
+
+    def report(self, now=None):
+        elapsed = max((now or time.perf_counter()) - self.start, 1e-9)
+        print("%d/%d tasks, %d rows, %.1f tasks/s, %.0f rows/s, %.1f s" % (
+            self.tasks, self.total, self.rows, self.tasks / elapsed, self.rows / elapsed, elapsed), file=self.stream)
+
+
+"""
+Maps function over argument tuples on a process pool keeping at most
+window tasks in flight, results are yielded in order
+"""
+
+def bounded_map(executor, function, tasks, window):
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(function, *task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+"""
+Runs every site x profile combination and writes results incrementally
+
+Parameters:
+    sites: list of (site id, latitude, longitude)
+    profiles: dict returned by load_profiles
+    frequency: channel frequency in GHz
+    bandwidth: channel bandwidth in MHz
+    writer: object with a write(columns) method, see CsvWriter
+    grid, num_receivers, rings: receiver and network layout, see generate_coordinates
+    workers: number of worker processes, 1 runs in the calling process
+    progress: Progress reporting after every task, optional
+
+Returns:
+    rows: number of written rows
+"""
+
+def run(sites, profiles, frequency, bandwidth, writer, grid=False, num_receivers=20, rings=1, workers=1, progress=None):
+    tasks = ((site, name, profile, frequency, bandwidth, grid, num_receivers, rings)
+             for site in sites for name, profile in profiles.items())
+
+    if workers == 1:
+        return _write_results((run_site(*task) for task in tasks), writer, progress)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # A few tasks per worker keep workers busy while results are written
+        return _write_results(bounded_map(executor, run_site, tasks, workers * 4), writer, progress)
+
+
+def _write_results(results, writer, progress):
+    rows = 0
+    for columns in results:
+        count = len(columns["distance"])
+        writer.write(columns)
+        rows += count
+        if progress is not None:
+            progress.update(count)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs config.ini profiles for every site of a CSV or GeoJSON file")
+    parser.add_argument("config", help="config.ini with one section per profile")
+    parser.add_argument("sites", help="CSV with latitude and longitude columns or GeoJSON of points")
+    parser.add_argument("output", help="results file, .csv or .parquet")
+    parser.add_argument("--frequency", type=float, required=True, help="channel frequency in GHz")
+    parser.add_argument("--bandwidth", type=float, required=True, help="channel bandwidth in MHz")
+    parser.add_argument("--profile", action="append", help="profile to run, may be repeated, all by default")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="output format, from extension by default")
+    parser.add_argument("--grid", action="store_true", help="receivers as a grid instead of a line")
+    parser.add_argument("--num-receivers", type=int, default=20, help="receivers on the line or grid points per axis")
+    parser.add_argument("--rings", type=int, default=1, help="tiers of interfering sites")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    args = parser.parse_args(argv)
+
+    profiles = load_profiles(args.config, args.profile)
+    sites = load_sites(args.sites)
+    progress = Progress(len(sites) * len(profiles))
+    writer = get_writer(args.output, args.format)
+
+    try:
+        run(sites, profiles, args.frequency, args.bandwidth, writer, args.grid, args.num_receivers,
+            args.rings, args.workers, progress)
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from simulator import Simulator, merge_pruning_errors
+from sweep import run_sweep_task, stack_results, sweep_tasks
+
+# Default number of receivers evaluated by one task
+CHUNK_SIZE = 10000
+
+
+"""
+Returns number of worker processes, all available cores by default
+"""
+
+def get_workers(workers=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(int(workers), 1)
+
+
+"""
+Splits an array of receiver coordinates into chunks of at most chunk_size rows
+"""
+
+def split_receivers(receivers, chunk_size=CHUNK_SIZE):
+    chunks = max(int(np.ceil(len(receivers) / chunk_size)), 1)
+    return np.array_split(receivers, chunks)
+
+
+"""
+Worker function: batched simulation for one chunk of receivers,
+returns columnar results and the pruning error of the chunk
+"""
+
+def run_chunk(site_coordinates, receiver_coordinates, params, frequency, bandwidth):
+    data = {
+        "site_coordinates": site_coordinates,
+        "receiver_coordinates": receiver_coordinates
+    }
+    simulator = Simulator(data, params)
+    results = simulator.run_batch(frequency, bandwidth, columnar=True)
+    return results, simulator.pruning_error
+
+
+"""
+Runs the batched simulator on a process pool: receivers are split into chunks
+of coordinates which are evaluated independently and merged in order
+
+Parameters:
+    data: dict returned by generator.generate_data or generator.generate_coordinates
+    params: simulation parameters
+    frequency: channel frequency in GHz
+    bandwidth: channel bandwidth in MHz
+    workers: number of worker processes, all cores by default
+    chunk_size: number of receivers per task
+    columnar: return a dict of NumPy arrays instead of a dict of lists
+    pruning_error: also return the pruning error of all chunks
+
+Returns:
+    results: same as Simulator.run_batch
+    pruning_error: only if requested, same as Simulator.pruning_error
+                   for all receivers, None without interferer pruning
+"""
+
+def run_parallel(data, params, frequency, bandwidth, workers=None, chunk_size=CHUNK_SIZE, columnar=False, pruning_error=False):
+
+    simulator = Simulator(data, params)
+    site_coordinates = simulator.site_coordinates()
+    receivers = simulator.coordinates()
+
+    chunks = split_receivers(receivers, chunk_size)
+    count = len(chunks)
+
+    with ProcessPoolExecutor(max_workers=get_workers(workers)) as executor:
+        parts = list(executor.map(run_chunk, [site_coordinates] * count, chunks, [params] * count,
+                                  [frequency] * count, [bandwidth] * count))
+
+    results = {key: np.concatenate([part[key] for part, error in parts]) for key in parts[0][0]}
+    if not columnar:
+        results = {key: value.tolist() for key, value in results.items()}
+    if not pruning_error:
+        return results
+
+    total_error = None
+    for part, error in parts:
+        if error is not None:
+            total_error = merge_pruning_errors(total_error, error)
+    return results, total_error
+
+
+"""
+Runs sweep.sweep on a process pool, one task per (radius, frequency, tx_height)
+
+Parameters:
+    same as sweep.sweep
+    workers: number of worker processes, all cores by default
+
+Returns:
+    results: same as sweep.sweep, rows in the same order
+"""
+
+def sweep_parallel(coordinates, params, frequencies, bandwidths, radii, tx_heights=None, tx_powers=None, grid=False, num_receivers=20, rings=1, workers=None):
+
+    tasks = list(sweep_tasks(coordinates, params, frequencies, bandwidths, radii, tx_heights, tx_powers, grid, num_receivers, rings))
+    if not tasks:
+        return stack_results([])
+
+    with ProcessPoolExecutor(max_workers=get_workers(workers)) as executor:
+        blocks = list(executor.map(run_sweep_task, *zip(*tasks)))
+
+    return stack_results(blocks)
@@ -1,26 +1,104 @@
-import geopandas as geopd
 import hexcover
+import instrumentation
+import numpy as np
+import projection
 
-from shapely.geometry import Point, MultiPoint, LineString
+# GeoPandas and Shapely are imported inside the functions building geometry,
+# generate_coordinates and the simulation itself need NumPy only
 
 
-def generate_data(coordinates, radius, grid=False, num_receivers=20):
+"""
+Receiver coordinates for a regular grid of num_receivers x num_receivers
+candidate points over the bounds of a hexagonal site, keeping only points
+inside the hexagon. Containment is tested analytically on whole arrays.
+
+Parameters:
+    centre: central point of the hexagon
+    size: hexagon side length in meters
+    bounds: (minx, miny, maxx, maxy) of the hexagon
+    num_receivers: number of grid points along each axis
+
+Returns:
+    receivers: NumPy array of receiver coordinates of shape (n, 2)
+"""
+
+def grid_receivers(centre, size, bounds, num_receivers):
+    minx, miny, maxx, maxy = bounds
+
+    x_ax = np.linspace(minx, maxx, num=num_receivers)
+    y_ax = np.linspace(miny, maxy, num=num_receivers)
+    xv, yv = np.meshgrid(x_ax, y_ax, sparse=False, indexing="ij")
+    xv, yv = xv.ravel(), yv.ravel()
+
+    inside = hexcover.hexagon_contains(xv, yv, centre, size)
+    return np.column_stack((xv[inside], yv[inside]))
+
+
+# Default number of grid points generated at once by receiver_chunks
+RECEIVER_CHUNK_SIZE = 65536
+
+
+"""
+Same receivers as grid_receivers in the same order, generated lazily
+in chunks so the whole grid is never held in memory
+
+Parameters:
+    centre, size, bounds, num_receivers: same as grid_receivers
+    chunk_size: number of grid points tested per chunk, chunks hold
+                at most this many receivers
+
+Returns:
+    chunks: generator of NumPy arrays of receiver coordinates of shape (n, 2)
+"""
+
+def grid_receiver_chunks(centre, size, bounds, num_receivers, chunk_size=RECEIVER_CHUNK_SIZE):
+    minx, miny, maxx, maxy = bounds
+
+    x_ax = np.linspace(minx, maxx, num=num_receivers)
+    y_ax = np.linspace(miny, maxy, num=num_receivers)
+
+    for start in range(0, num_receivers * num_receivers, chunk_size):
+        points = np.arange(start, min(start + chunk_size, num_receivers * num_receivers))
+        xv, yv = x_ax[points // num_receivers], y_ax[points % num_receivers]
+
+        inside = hexcover.hexagon_contains(xv, yv, centre, size)
+        if np.any(inside):
+            yield np.column_stack((xv[inside], yv[inside]))
+
+
+"""
+Generates antenna, sites, centroids and receivers for simulation
+
+Parameters:
+    coordinates: (latitude, longitude) of the antenna
+    radius: cell radius in meters
+    grid: generate receivers as a grid over the central site
+          instead of a line from antenna to site edge
+    num_receivers: number of receivers on the line or grid points along each axis
+    receiver_geometry: if False, receivers are returned only as a coordinate
+                       array and no shapely points or GeoSeries are created
+    rings: number of tiers of neighbouring sites around the central one
+    crs: projected spatial reference system in meters used for simulation,
+         EPSG:3765 for Croatia by default
+"""
+
+@instrumentation.timed("generate")
+def generate_data(coordinates, radius, grid=False, num_receivers=20, receiver_geometry=True, rings=1, crs=projection.DEFAULT_CRS):
+    import geopandas as geopd
+    from shapely.geometry import Point
 
     # Central point of central polygon
     # Default spatial reference system for GeoJSON: EPSG:4326 (Google Maps, OpenStreetMap...)
     # Spatial reference system for Croatia: EPSG:3765
     # Coordinates (45.762680, 15.999007) projected in EPSG:3765
     # Latitude and longitude positions are "inversed": see EPSG:4326 specification
-    antenna = Point(coordinates[1], coordinates[0])
-    antenna = geopd.GeoSeries(antenna)
-    antenna.crs = "EPSG:4326"
-    antenna = antenna.to_crs("EPSG:3765")[0]
-
-    # Hexcover method for coverage returns a named tuple of seven shapely polygons
-    # First polygon is always the central one
-    hexagons = hexcover.hexagon_coverage(antenna, radius)
+    antenna = Point(projection.to_projected(coordinates[1], coordinates[0], crs))
+
+    # Hexcover returns a list of 1 + 3 * rings * (rings + 1) shapely polygons,
+    # first polygon is always the central one
+    hexagons = hexcover.hexagon_network(antenna, radius, rings)
     sites = geopd.GeoSeries(hexagons)
-    sites.crs = "EPSG:3765"
+    sites.crs = crs
 
     # Central points of each site
     # First centroid has the same value as antenna
@@ -39,44 +117,225 @@ def generate_data(coordinates, radius, grid=False, num_receivers=20):
     receivers = []
 
     if grid:
-        import numpy as np
-        site_bounds = sites[0].bounds
-        minx, miny = site_bounds[0], site_bounds[1]
-        maxx, maxy = site_bounds[2], site_bounds[3]
-
-        x_ax = np.linspace(minx, maxx, num=num_receivers)
-        y_ax = np.linspace(miny, maxy, num=num_receivers)
-        xv, yv = np.meshgrid(x_ax, y_ax, sparse=False, indexing="ij")
-
-        for i in range(len(x_ax)):
-            for j in range(len(y_ax)):
-                receiver = Point(xv[i, j], yv[i, j])
-                if sites[0].contains(receiver):
-                    receivers.append(receiver)
+        receiver_coordinates = grid_receivers(antenna, radius, sites[0].bounds, num_receivers)
+        if receiver_geometry:
+            receivers = [Point(x, y) for x, y in receiver_coordinates]
 
     else:
-        site_edge = MultiPoint(sites[0].boundary.coords)[0]
-        path = LineString([centroids[0], site_edge])
-        path_length = path.length
-        path_increment = path_length // num_receivers
-
-        for i in range(num_receivers):
-            receiver = path.interpolate(path_increment * i)
-            receivers.append(receiver)
+        receiver_coordinates = line_receivers(np.asarray(sites[0].exterior.coords), num_receivers)
+        receivers = [Point(x, y) for x, y in receiver_coordinates]
 
-    receivers = geopd.GeoSeries(receivers)
-    receivers.crs = "EPSG:3765"
+    if receiver_geometry:
+        receivers = geopd.GeoSeries(receivers)
+        receivers.crs = crs
+    else:
+        receivers = None
 
     results = {
         "antenna": antenna,
+        "radius": radius,
         "sites": sites,
         "centroids": centroids,
-        "receivers": receivers
+        "receivers": receivers,
+        "receiver_coordinates": receiver_coordinates,
+        "crs": crs
     }
 
-    complete_data = sites.append(centroids).append(receivers)
-    complete_data.crs = "EPSG:3765"
-    complete_data = complete_data.to_crs("EPSG:4326")
-    complete_data.to_file("data.geojson", driver="GeoJSON")
+    return results
+
+
+"""
+Generates site and receiver coordinates for simulation without building
+any geometry, so only NumPy and the projection are needed. Receivers are
+placed as in generate_data.
+
+Parameters:
+    coordinates: (latitude, longitude) of the antenna
+    radius: cell radius in meters
+    grid: generate receivers as a grid over the central site
+          instead of a line from antenna to site edge
+    num_receivers: number of receivers on the line or grid points along each axis
+    rings: number of tiers of neighbouring sites around the central one
+    crs: projected spatial reference system in meters used for simulation
+
+Returns:
+    data: dict with "site_coordinates" of shape (sites, 2), serving site first,
+          "receiver_coordinates" of shape (receivers, 2), "radius" and "crs",
+          accepted by Simulator, geometry_coordinates and export_geojson
+"""
+
+@instrumentation.timed("generate")
+def generate_coordinates(coordinates, radius, grid=False, num_receivers=20, rings=1, crs=projection.DEFAULT_CRS):
+
+    antenna, site_coordinates, vertices = site_layout(coordinates, radius, rings, crs)
+
+    if grid:
+        bounds = tuple(vertices.min(axis=0)) + tuple(vertices.max(axis=0))
+        receiver_coordinates = grid_receivers(antenna, radius, bounds, num_receivers)
+
+    else:
+        # Line from antenna to the first vertex of the central hexagon
+        receiver_coordinates = line_receivers(vertices, num_receivers)
+
+    results = {
+        "site_coordinates": site_coordinates,
+        "receiver_coordinates": receiver_coordinates,
+        "radius": radius,
+        "crs": crs
+    }
 
     return results
+
+
+"""
+Returns projected antenna position, coordinates of all sites ordered as the
+polygons of generate_data, and vertices of the central site of shape (7, 2)
+"""
+
+def site_layout(coordinates, radius, rings=1, crs=projection.DEFAULT_CRS):
+
+    x, y = projection.to_projected(coordinates[1], coordinates[0], crs)
+    antenna = hexcover.Centre(float(x), float(y))
+    site_coordinates = hexcover.hexagon_centres(antenna, radius, rings)
+
+    return antenna, site_coordinates, hexcover.hexagon_vertices(site_coordinates[:1], radius)[0]
+
+
+"""
+Returns coordinates of shape (num_receivers, 2) of receivers on the line from
+the centroid of the central site polygon to its first vertex, the first one at
+the centroid. Receivers are spaced by the line length divided by num_receivers,
+rounded down to whole meters, and placed as shapely's LineString.interpolate
+does. Both generators place receivers on a line with this function.
+
+Parameters:
+    vertices: closed ring of the central site polygon of shape (7, 2)
+    num_receivers: number of receivers
+"""
+
+def line_receivers(vertices, num_receivers):
+    start = np.array(polygon_centroid(vertices))
+    path = np.asarray(vertices[0], dtype=float) - start
+    path_length = np.sqrt(path[0] * path[0] + path[1] * path[1])
+    path_increment = path_length // num_receivers
+
+    steps = path_increment * np.arange(num_receivers) / path_length
+    return start + steps[:, np.newaxis] * path
+
+
+"""
+Returns the centroid (x, y) of a polygon given by its closed ring of vertices,
+computed term by term as GEOS does, so it equals the shapely centroid exactly.
+The centroid can differ from the antenna position by about 1e-10 m, which
+decides the rounding of the receiver spacing in line_receivers.
+"""
+
+def polygon_centroid(vertices):
+    vertices = np.asarray(vertices, dtype=float)
+    base = vertices[0]
+    # Triangles are weighted by signed doubled area, positive for clockwise rings
+    clockwise = np.sum(vertices[:-1, 0] * vertices[1:, 1] - vertices[1:, 0] * vertices[:-1, 1]) < 0
+    sign = 1.0 if clockwise else -1.0
+
+    area_sum = x_sum = y_sum = 0.0
+    for first, second in zip(vertices[:-1], vertices[1:]):
+        area = sign * ((first[0] - base[0]) * (second[1] - base[1]) - (second[0] - base[0]) * (first[1] - base[1]))
+        x_sum += area * (base[0] + first[0] + second[0])
+        y_sum += area * (base[1] + first[1] + second[1])
+        area_sum += area
+
+    return x_sum / 3 / area_sum, y_sum / 3 / area_sum
+
+
+"""
+Generates site coordinates and a generator of receiver coordinate chunks,
+for grids too large to be held in memory. Receivers are the same as in
+generate_coordinates and come in the same order.
+
+Parameters:
+    same as generate_coordinates
+    chunk_size: number of grid points tested per chunk
+
+Returns:
+    data: dict returned by generate_coordinates without "receiver_coordinates"
+    chunks: generator of receiver coordinate arrays of shape (n, 2),
+            to be consumed by Simulator.run_chunks
+"""
+
+def receiver_chunks(coordinates, radius, grid=True, num_receivers=20, rings=1, crs=projection.DEFAULT_CRS, chunk_size=RECEIVER_CHUNK_SIZE):
+
+    if not grid:
+        # Receivers on a line are few, they are generated at once
+        data = generate_coordinates(coordinates, radius, grid=False, num_receivers=num_receivers, rings=rings, crs=crs)
+        receivers = data.pop("receiver_coordinates")
+        return data, (receivers[start:start + chunk_size] for start in range(0, len(receivers), chunk_size))
+
+    antenna, site_coordinates, vertices = site_layout(coordinates, radius, rings, crs)
+    bounds = tuple(vertices.min(axis=0)) + tuple(vertices.max(axis=0))
+    data = {
+        "site_coordinates": site_coordinates,
+        "radius": radius,
+        "crs": crs
+    }
+
+    return data, grid_receiver_chunks(antenna, radius, bounds, num_receivers, chunk_size)
+
+
+"""
+Exports sites, centroids and receivers returned by generate_data
+as GeoJSON in EPSG:4326. This is the only place data is exported.
+
+Parameters:
+    data: dict returned by generate_data
+    path: file the GeoJSON is written to, if None nothing is written to disk
+
+Returns:
+    GeoJSON string if path is None, otherwise None
+"""
+
+@instrumentation.timed("geojson")
+def export_geojson(data, path=None):
+    import geopandas as geopd
+    from shapely.geometry import Polygon
+
+    # Geometry is rebuilt from reprojected coordinates, no GeoSeries reprojection needed
+    geometry = geometry_coordinates(data)
+    sites = [Polygon(vertices) for vertices in geometry["sites"]]
+    points = np.concatenate((geometry["centroids"], geometry["receivers"]))
+    points = list(geopd.points_from_xy(points[:, 0], points[:, 1]))
+
+    # Each group of features is numbered from 0 in the exported ids
+    index = np.concatenate([np.arange(len(geometry[key])) for key in ("sites", "centroids", "receivers")])
+    complete_data = geopd.GeoSeries(sites + points, index=index)
+    complete_data.crs = projection.GEOGRAPHIC_CRS
+
+    if path is None:
+        return complete_data.to_json()
+    complete_data.to_file(path, driver="GeoJSON")
+
+
+"""
+Returns geometry of data returned by generate_data as coordinate
+arrays in EPSG:4326, (longitude, latitude) order
+
+Returns:
+    geometry: dict with "sites" of shape (sites, vertices, 2),
+              "centroids" of shape (sites, 2) and "receivers" of shape (receivers, 2)
+"""
+
+def geometry_coordinates(data):
+
+    crs = data.get("crs", projection.DEFAULT_CRS)
+    if data.get("sites") is not None:
+        sites = np.array([polygon.exterior.coords for polygon in data["sites"]], dtype=float)
+        centroids = np.column_stack((np.asarray(data["centroids"].x), np.asarray(data["centroids"].y)))
+    else:
+        # Data from generate_coordinates, hexagons are rebuilt from their centres
+        centroids = data["site_coordinates"]
+        sites = hexcover.hexagon_vertices(centroids, data["radius"])
+
+    return {
+        "sites": projection.transform_coordinates(sites, crs, projection.GEOGRAPHIC_CRS),
+        "centroids": projection.transform_coordinates(centroids, crs, projection.GEOGRAPHIC_CRS),
+        "receivers": projection.transform_coordinates(data["receiver_coordinates"], crs, projection.GEOGRAPHIC_CRS)
+    }
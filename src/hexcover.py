@@ -41,17 +41,22 @@ damages related to this software or this license, under any kind of legal claim.
 __author__ = u"Stephan Hügel <shugel@tcd.ie>"
 __version__ = "0.4.0"
 
-from shapely.geometry import Polygon
-from shapely.affinity import translate
 import math
 from collections import namedtuple
 
+import numpy as np
+
+# Shapely is imported only by the functions building polygons, coordinate
+# functions need NumPy alone and accept any centre having x and y attributes
+
 
 Hexagons = namedtuple(
     "Hexagons",
     ["centre", "top", "topright", "bottomright", "bottom", "bottomleft", "topleft"],
 )
 
+Centre = namedtuple("Centre", ["x", "y"])
+
 
 def _flat_hex_coords(centre, size, i):
     """ Return the point coordinate of a flat-topped regular hexagon.
@@ -69,9 +74,36 @@ def _flat_hex_coords(centre, size, i):
 
 def _flat_hex_polygon(centre, size):
     """ Return a flat-topped regular hexagonal Polygon, given a centroid Point and side length """
+    from shapely.geometry import Polygon
     return Polygon([_flat_hex_coords(centre, size, i) for i in range(6)])
 
 
+def hexagon_vertices(centres, size):
+    """ Return vertex coordinates of flat-topped regular hexagons having side length
+    _size_ and centroids given by an array _centres_ of shape (n, 2), as an array of
+    shape (n, 7, 2). Vertices are in the order of _flat_hex_coords and every ring is
+    closed by repeating its first vertex, as in Polygon.exterior.coords.
+    """
+    centres = np.asarray(centres, dtype=float).reshape(-1, 2)
+    offsets = np.array([_flat_hex_coords(Centre(0.0, 0.0), size, i % 6) for i in range(7)])
+    return centres[:, np.newaxis, :] + offsets[np.newaxis, :, :]
+
+
+def hexagon_contains(x, y, centre, size, tolerance=1e-9):
+    """ Return a boolean array which is True where the points given by coordinate
+    arrays _x_ and _y_ lie strictly inside the flat-topped regular hexagon having
+    centroid _centre_ and side length _size_.
+    The test is analytic and evaluated on whole coordinate arrays at once.
+    Points closer to the boundary than a relative _tolerance_ of the size are
+    treated as lying on it, matching Polygon.contains for points on the edges.
+    """
+    dx = np.abs(np.asarray(x, dtype=float) - centre.x)
+    dy = np.abs(np.asarray(y, dtype=float) - centre.y)
+    half_height = math.sqrt(3) / 2 * size
+    margin = tolerance * size
+    return (dy < half_height - margin) & (math.sqrt(3) * dx + dy < math.sqrt(3) * size - margin)
+
+
 def hexagon_coverage(centre, size):
     """ Tile an area having a Shapely Point centroid _centre_ with regular flat-topped
     hexagonal polygons having side-length _size_.
@@ -79,6 +111,7 @@ def hexagon_coverage(centre, size):
     0 is the central polygon, 1 - 6 are surrounding polygons, beginning directly
     above 0, progressing clockwise.
     """
+    from shapely.affinity import translate
     cp = _flat_hex_polygon(centre, size)
     width = 2 * size
     height = math.sqrt(3) * size
@@ -94,3 +127,61 @@ def hexagon_coverage(centre, size):
         translate(cp, -horizontal_distance, vertical_distance),
         translate(cp, -horizontal_distance, -vertical_distance),
     )
+
+
+# Axial coordinates of the first ring in the order of hexagon_coverage:
+# above, upper right, lower right, below, upper left, lower left
+_COVERAGE_RING = ((0, 1), (1, 0), (1, -1), (0, -1), (-1, 1), (-1, 0))
+
+# Axial directions walked clockwise around a ring of flat-topped hexagons,
+# starting from the hexagon directly above the centre
+_RING_DIRECTIONS = ((1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1), (1, 0))
+
+
+def _axial_ring_coords(rings):
+    """ Return an integer array of shape (1 + 3 * rings * (rings + 1), 2) holding
+    axial (q, r) coordinates of all hexagons up to and including ring _rings_.
+    Ring 0 is the centre and ring 1 is in the order of hexagon_coverage, every
+    following ring starts directly above the centre and progresses clockwise.
+    """
+    coords = [(0, 0)]
+    if rings >= 1:
+        coords.extend(_COVERAGE_RING)
+    for ring in range(2, rings + 1):
+        q, r = 0, ring
+        for dq, dr in _RING_DIRECTIONS:
+            for _ in range(ring):
+                coords.append((q, r))
+                q, r = q + dq, r + dr
+    return np.array(coords, dtype=int)
+
+
+def _hexagon_offsets(size, rings):
+    """ Return offsets of the centroids of _axial_ring_coords from the central
+    hexagon, for ring 1 equal to the translations of hexagon_coverage.
+    """
+    axial = _axial_ring_coords(rings)
+    q, r = axial[:, 0], axial[:, 1]
+    return np.column_stack((size * 1.5 * q, size * math.sqrt(3) * (r + q / 2)))
+
+
+def hexagon_centres(centre, size, rings=1):
+    """ Return centroid coordinates of a network of regular flat-topped hexagons
+    having side-length _size_ tiled around a Shapely Point _centre_, as a NumPy
+    array of shape (1 + 3 * rings * (rings + 1), 2).
+    0 is the central hexagon, followed by each ring of neighbours (6, 12, 18...)
+    beginning directly above 0, in the order of _axial_ring_coords. With one
+    ring the centroids are those of hexagon_coverage.
+    """
+    return np.array([centre.x, centre.y]) + _hexagon_offsets(size, rings)
+
+
+def hexagon_network(centre, size, rings=1):
+    """ Tile an area having a Shapely Point centroid _centre_ with _rings_ tiers of
+    regular flat-topped hexagonal polygons having side-length _size_.
+    Polygons are returned in a list in the order of hexagon_centres, with one
+    ring they are those of hexagon_coverage.
+    """
+    from shapely.affinity import translate
+    cp = _flat_hex_polygon(centre, size)
+    return [cp] + [translate(cp, dx, dy) for dx, dy in _hexagon_offsets(size, rings)[1:]]
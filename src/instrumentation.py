@@ -0,0 +1,152 @@
+import contextvars
+import functools
+import time
+
+"""
+Per-stage timing and counters for simulation requests
+
+A Profiler is activated for the current context (request, thread or task)
+and instrumented code reports to whichever profiler is active:
+
+    with instrumentation.stage("path_loss"):
+        ...
+    instrumentation.count("receivers", len(receivers))
+
+Without an active profiler stage and count go to a disabled profiler and
+do nothing beyond a context variable lookup. Stages may be nested, e.g.
+"projection" is also counted in "generate".
+"""
+
+
+"""
+Accumulates wall and CPU time per stage and named counters
+"""
+
+class Profiler(object):
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+
+    """
+    Returns context manager timing a stage, times of stages
+    with the same name are summed
+    """
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add(self, name, wall, cpu):
+        total = self.stages.get(name)
+        if total is None:
+            self.stages[name] = {"wall": wall, "cpu": cpu, "calls": 1}
+        else:
+            total["wall"] += wall
+            total["cpu"] += cpu
+            total["calls"] += 1
+
+    """
+    Returns stages and counters as a dict, times in milliseconds
+    """
+    def as_dict(self):
+        return {
+            "total": round((time.perf_counter() - self.start) * 1000, 3),
+            "stages": {name: {"wall": round(total["wall"] * 1000, 3), "cpu": round(total["cpu"] * 1000, 3),
+                              "calls": total["calls"]} for name, total in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    """
+    Returns value of a Server-Timing header: wall time of every stage
+    as its duration and CPU time in its description
+    """
+    def server_timing(self):
+        metrics = ['%s;dur=%.3f;desc="cpu %.3f ms"' % (name, total["wall"] * 1000, total["cpu"] * 1000)
+                   for name, total in self.stages.items()]
+        metrics.append("total;dur=%.3f" % ((time.perf_counter() - self.start) * 1000))
+        return ", ".join(metrics)
+
+
+class _Stage(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        # CPU time of the calling thread, other requests served in parallel are not counted
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, time.perf_counter() - self.wall, time.thread_time() - self.cpu)
+        return False
+
+
+class _NullStage(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+_DISABLED = Profiler(enabled=False)
+_current = contextvars.ContextVar("profiler", default=_DISABLED)
+
+
+"""
+Returns profiler of the current context, a disabled one if none is active
+"""
+
+def get_profiler():
+    return _current.get()
+
+
+"""
+Activates profiler for the current context
+
+Returns:
+    token: to be passed to deactivate
+"""
+
+def activate(profiler):
+    return _current.set(profiler)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def stage(name):
+    return _current.get().stage(name)
+
+
+def count(name, value=1):
+    profiler = _current.get()
+    if profiler.enabled:
+        profiler.count(name, value)
+
+
+"""
+Decorator timing every call of a function as a stage
+"""
+
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _current.get().stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import numpy as np
 
 """
@@ -11,7 +13,7 @@ Parameters:
     antenna_type: macro or micro
     avg_building_height: average building height in meters
     avg_street_width: average street width in meters
-    
+
 Returns:
     loss: path loss in dB
 """
@@ -25,6 +27,24 @@ def get_loss_object(frequency, area_type=None, city_type=None, antenna_type=None
         raise ValueError("Frequency out of range")
 
 
+# Maximum number of loss objects kept by get_cached_loss_object
+LOSS_OBJECT_CACHE_SIZE = 128
+
+# Maximum number of (frequency, tx_height, rx_height) term sets kept per loss object
+LOSS_TERMS_CACHE_SIZE = 32
+
+
+"""
+Same as get_loss_object, but loss objects are built once per parameter set
+and kept in a bounded LRU cache shared by everything in the process
+(simulator, web views...). Loss objects must not be modified by callers.
+"""
+
+@lru_cache(maxsize=LOSS_OBJECT_CACHE_SIZE)
+def get_cached_loss_object(frequency, area_type=None, city_type=None, antenna_type=None, avg_building_height=None, avg_street_width=None):
+    return get_loss_object(frequency, area_type, city_type, antenna_type, avg_building_height, avg_street_width)
+
+
 """
 Base class for loss models
 """
@@ -43,10 +63,13 @@ class Loss(object):
         self.min_distance = None
         self.max_distance = None
         self.name = None
+        # Shadow fading standard deviation in dB used by compute_loss_distribution
+        self.shadowing = 0.0
+        self._terms = {}
 
     """
     Abstract method for calculating path loss
-    
+
     Parameters:
         frequency: channel frequency in GHz
         distance: distance between transmitter and receiver in meters
@@ -56,6 +79,69 @@ class Loss(object):
     def compute_loss(self, frequency, distance, tx_height, rx_height):
         pass
 
+    """
+    Abstract method for calculating path loss for an array of distances
+
+    Parameters:
+        frequency: channel frequency in GHz
+        distance: array of distances between transmitter and receivers in meters
+        tx_height: transmitter height
+        rx_height: receiver height, scalar or array broadcastable to distance
+
+    Returns:
+        loss: array of path losses in dB, NaN where compute_loss has no value
+    """
+    def compute_loss_array(self, frequency, distance, tx_height, rx_height):
+        pass
+
+    """
+    Abstract method for calculating terms of the loss formula
+    which do not depend on distance
+    """
+    def compute_terms(self, frequency, tx_height, rx_height):
+        return {}
+
+    """
+    Returns distribution of path loss for an array of distances for random
+    line of sight and log-normal shadow fading, see montecarlo. Models without
+    a line of sight condition have a line of sight probability of 1.
+
+    Parameters:
+        same as compute_loss_array
+
+    Returns:
+        distribution: dict of arrays "los_probability", "los_loss" and "nlos_loss"
+                      (path loss in dB with and without line of sight), and
+                      "los_shadowing" and "nlos_shadowing" (shadow fading
+                      standard deviation in dB)
+    """
+    def compute_loss_distribution(self, frequency, distance, tx_height, rx_height):
+        loss = self.compute_loss_array(frequency, distance, tx_height, rx_height)
+        return {
+            "los_probability": np.ones(loss.shape),
+            "los_loss": loss,
+            "nlos_loss": loss,
+            "los_shadowing": np.full(loss.shape, self.shadowing),
+            "nlos_shadowing": np.full(loss.shape, self.shadowing),
+        }
+
+    """
+    Returns terms of the loss formula which do not depend on distance.
+    Terms for scalar heights are computed once and kept on the object.
+    """
+    def get_terms(self, frequency, tx_height, rx_height):
+        if np.ndim(tx_height) or np.ndim(rx_height):
+            return self.compute_terms(frequency, tx_height, rx_height)
+
+        key = (frequency, tx_height, rx_height)
+        terms = self._terms.get(key)
+        if terms is None:
+            if len(self._terms) >= LOSS_TERMS_CACHE_SIZE:
+                self._terms.clear()
+            terms = self.compute_terms(frequency, tx_height, rx_height)
+            self._terms[key] = terms
+        return terms
+
 
 """
 Okumura Hata propagation model for path loss
@@ -69,14 +155,16 @@ class OkumuraHata(Loss):
         self.min_distance = 1000
         self.max_distance = 10000
         self.name = "Okumura-Hata"
+        # Typical spread of measurements around the model, not part of the model itself
+        self.shadowing = 8.0
 
-    def compute_loss(self, frequency, distance, tx_height, rx_height):
+    def compute_terms(self, frequency, tx_height, rx_height):
 
         frequency = frequency * 1000    # Conversion from GHz to MHz
-        distance = distance / 1000      # Conversion from m to km
+        log_frequency = np.log10(frequency)
 
         if self.city_type == 'small' or self.city_type == 'medium':
-            correction_factor = 0.8 + (1.1 * np.log10(frequency) - 0.7) * rx_height - 1.56 * np.log10(frequency)
+            correction_factor = 0.8 + (1.1 * log_frequency - 0.7) * rx_height - 1.56 * log_frequency
         elif self.city_type == 'large':
             if 150 <= frequency <= 200:
                 correction_factor = 8.29 * np.power(np.log10(1.54 * rx_height), 2) - 1.1
@@ -87,18 +175,50 @@ class OkumuraHata(Loss):
         else:
             raise ValueError("Incorrect city type")
 
-        loss = 69.55 + 26.16 * np.log10(frequency) - 13.82 * np.log10(tx_height) - correction_factor + (
-                    44.9 - 6.55 * np.log10(tx_height)) * np.log10(distance)
+        if self.area_type == 'suburban':
+            area_correction = -2 * np.power(np.log10(frequency / 28), 2) - 5.4
+        elif self.area_type == 'rural':
+            area_correction = -4.78 * np.power(log_frequency, 2) + 18.33 * log_frequency - 40.94
+        else:
+            area_correction = None
+
+        return {
+            "correction_factor": correction_factor,
+            "constant_loss": 69.55 + 26.16 * log_frequency - 13.82 * np.log10(tx_height) - correction_factor,
+            "distance_slope": 44.9 - 6.55 * np.log10(tx_height),
+            "area_correction": area_correction,
+        }
+
+    def compute_loss(self, frequency, distance, tx_height, rx_height):
+
+        terms = self.get_terms(frequency, tx_height, rx_height)
+        distance = distance / 1000      # Conversion from m to km
+
+        loss = terms["constant_loss"] + terms["distance_slope"] * np.log10(distance)
 
         if self.area_type == 'urban':
             return round(loss, 2)
-        elif self.area_type == 'suburban':
-            loss += -2 * np.power(np.log10(frequency / 28), 2) - 5.4
-            return round(loss, 2)
-        elif self.area_type == 'rural':
-            loss += -4.78 * np.power(np.log10(frequency), 2) + 18.33 * np.log10(frequency) - 40.94
+        elif self.area_type == 'suburban' or self.area_type == 'rural':
+            loss += terms["area_correction"]
             return round(loss, 2)
 
+    def compute_loss_array(self, frequency, distance, tx_height, rx_height):
+
+        # Terms are taken for the caller's heights, scalar heights hit the cache
+        terms = self.get_terms(frequency, tx_height, rx_height)
+        distance, rx_height = _as_float_arrays(distance, rx_height)
+        distance = distance / 1000      # Conversion from m to km
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            loss = terms["constant_loss"] + terms["distance_slope"] * np.log10(distance)
+
+        if self.area_type == 'urban':
+            return np.round(loss, 2)
+        elif self.area_type == 'suburban' or self.area_type == 'rural':
+            loss += terms["area_correction"]
+            return np.round(loss, 2)
+        return np.full(distance.shape, np.nan)
+
 
 """
 Propagation model for path loss as defined in ETSI TR 38 901
@@ -131,19 +251,149 @@ class Etsi(Loss):
             self.min_distance = 10
             self.max_distance = 10000
 
+    def compute_terms(self, frequency, tx_height, rx_height):
+
+        if self.area_type == "urban" and self.antenna_type == "macro":
+            return etsi_urban_macro_terms(frequency, tx_height, rx_height)
+
+        elif self.area_type == "urban" and self.antenna_type == "micro":
+            return etsi_urban_micro_terms(frequency, tx_height, rx_height)
+
+        elif self.area_type == "rural" and self.antenna_type == "macro":
+            return etsi_rural_macro_terms(frequency, tx_height, rx_height, self.avg_building_height, self.avg_street_width)
+
+        return {}
+
     def compute_loss(self, frequency, distance, tx_height, rx_height):
 
+        terms = self.get_terms(frequency, tx_height, rx_height)
+
+        if self.area_type == "urban" and self.antenna_type == "macro":
+            return etsi_urban_macro_loss(frequency, distance, tx_height, rx_height, terms)
+
+        elif self.area_type == "urban" and self.antenna_type == "micro":
+            return etsi_urban_micro_loss(frequency, distance, tx_height, rx_height, terms)
+
+        elif self.area_type == "rural" and self.antenna_type == "macro":
+            return etsi_rural_macro_loss(frequency, distance, tx_height, rx_height, self.avg_building_height, self.avg_street_width, terms)
+
+    def compute_loss_array(self, frequency, distance, tx_height, rx_height, line_of_sight=None):
+
+        # Terms are taken for the caller's heights, scalar heights hit the cache
+        terms = self.get_terms(frequency, tx_height, rx_height)
+        distance, rx_height = _as_float_arrays(distance, rx_height)
+
+        if self.area_type == "urban" and self.antenna_type == "macro":
+            return etsi_urban_macro_loss_array(frequency, distance, tx_height, rx_height, terms, line_of_sight)
+
+        elif self.area_type == "urban" and self.antenna_type == "micro":
+            return etsi_urban_micro_loss_array(frequency, distance, tx_height, rx_height, terms, line_of_sight)
+
+        elif self.area_type == "rural" and self.antenna_type == "macro":
+            return etsi_rural_macro_loss_array(frequency, distance, tx_height, rx_height, self.avg_building_height, self.avg_street_width, terms, line_of_sight)
+
+        return np.full(distance.shape, np.nan)
+
+    """
+    Shadow fading standard deviations of ETSI TR 38 901 table 7.4.1-1,
+    rural macro line of sight is 4 dB before the breaking point and 6 dB after it
+    """
+    def compute_loss_distribution(self, frequency, distance, tx_height, rx_height):
+
+        terms = self.get_terms(frequency, tx_height, rx_height)
+        distance, rx_height = _as_float_arrays(distance, rx_height)
+
         if self.area_type == "urban" and self.antenna_type == "macro":
-            return etsi_urban_macro_loss(frequency, distance, tx_height, rx_height)
+            los_probability = etsi_urban_macro_los_probability(distance, rx_height)
+            los_shadowing, nlos_shadowing = 4.0, 6.0
 
         elif self.area_type == "urban" and self.antenna_type == "micro":
-            return etsi_urban_micro_loss(frequency, distance, tx_height, rx_height)
+            los_probability = etsi_urban_micro_los_probability(distance)
+            los_shadowing, nlos_shadowing = 4.0, 7.82
 
         elif self.area_type == "rural" and self.antenna_type == "macro":
-            return etsi_rural_macro_loss(frequency, distance, tx_height, rx_height, self.avg_building_height, self.avg_street_width)
+            los_probability = etsi_rural_macro_los_probability(distance)
+            los_shadowing = np.where(distance <= terms["breaking_point_distance"], 4.0, 6.0)
+            nlos_shadowing = 8.0
+
+        else:
+            return super().compute_loss_distribution(frequency, distance, tx_height, rx_height)
+
+        return {
+            "los_probability": los_probability,
+            "los_loss": self.compute_loss_array(frequency, distance, tx_height, rx_height, line_of_sight=True),
+            "nlos_loss": self.compute_loss_array(frequency, distance, tx_height, rx_height, line_of_sight=False),
+            "los_shadowing": np.broadcast_to(los_shadowing, distance.shape),
+            "nlos_shadowing": np.broadcast_to(nlos_shadowing, distance.shape),
+        }
 
 
-def etsi_urban_macro_loss(frequency, distance, tx_height, rx_height):
+"""
+Broadcasts distance and receiver height to float arrays of the same shape
+"""
+
+def _as_float_arrays(distance, rx_height):
+    return np.broadcast_arrays(np.asarray(distance, dtype=float), np.asarray(rx_height, dtype=float))
+
+
+"""
+Terms of the ETSI TR 38 901 loss formulas which depend only on frequency
+and antenna heights: frequency log terms and the breaking point distance
+"""
+
+def etsi_urban_macro_terms(frequency, tx_height, rx_height):
+
+    effective_environment_height = 1.0
+    breaking_point_distance = 4 * (tx_height - effective_environment_height) * (
+            rx_height - effective_environment_height) * (frequency * 10e9) / 3e8  # Frequency in Hz
+
+    return {
+        "frequency_loss": 20 * np.log10(frequency),
+        "breaking_point_distance": breaking_point_distance,
+        "breaking_point_loss": 9 * np.log10(np.power(breaking_point_distance, 2) + np.power(tx_height - rx_height, 2)),
+    }
+
+
+def etsi_urban_micro_terms(frequency, tx_height, rx_height):
+
+    effective_environment_height = 1.0
+    breaking_point_distance = 4 * (tx_height - effective_environment_height) * (rx_height - effective_environment_height) * (
+                frequency * 10e9) / 3e8  # Frequency in Hz
+
+    return {
+        "frequency_loss": 20 * np.log10(frequency),
+        "frequency_loss_nlos": 21.3 * np.log10(frequency),
+        "breaking_point_distance": breaking_point_distance,
+        "breaking_point_loss": 9.5 * np.log10(np.power(breaking_point_distance, 2) + np.power(tx_height - rx_height, 2)),
+    }
+
+
+def etsi_rural_macro_terms(frequency, tx_height, rx_height, avg_building_height, avg_street_width):
+
+    breaking_point_distance = 2 * np.pi * tx_height * rx_height * (frequency * 10e9) / 3e8  # Frequency in Hz
+    height_slope = min(0.03 * np.power(avg_building_height, 1.72), 10)
+    height_loss = min(0.044 * np.power(avg_building_height, 1.72), 14.77)
+    height_distance_slope = 0.002 * np.log10(avg_building_height)
+
+    return {
+        "frequency_loss": 20 * np.log10(frequency),
+        "breaking_point_distance": breaking_point_distance,
+        "height_slope": height_slope,
+        "height_loss": height_loss,
+        "height_distance_slope": height_distance_slope,
+        "breaking_point_loss": 20 * np.log10(40 * np.pi * breaking_point_distance * frequency / 3) + height_slope * np.log10(
+            breaking_point_distance) - height_loss + height_distance_slope * breaking_point_distance,
+        "constant_loss_nlos": 161.04 - 7.1 * np.log10(avg_street_width) + 7.5 * np.log10(avg_building_height) - (
+                24.37 - 3.7 * np.power(avg_building_height / tx_height, 2)) * np.log10(tx_height),
+        "distance_slope_nlos": 43.42 - 3.1 * np.log10(tx_height),
+        "rx_height_loss_nlos": 3.2 * np.power(np.log10(11.75 * rx_height), 2) - 4.97,
+    }
+
+
+def etsi_urban_macro_loss(frequency, distance, tx_height, rx_height, terms=None):
+
+    if terms is None:
+        terms = etsi_urban_macro_terms(frequency, tx_height, rx_height)
 
     distance2d = distance
     distance3d = np.sqrt(np.power(distance2d, 2) + np.power((tx_height - rx_height), 2))
@@ -160,33 +410,104 @@ def etsi_urban_macro_loss(frequency, distance, tx_height, rx_height):
         else:
             line_of_sight = 'nlos'
 
-    effective_environment_height = 1.0
-    breaking_point_distance = 4 * (tx_height - effective_environment_height) * (
-            rx_height - effective_environment_height) * (frequency * 10e9) / 3e8  # Frequency in Hz
+    breaking_point_distance = terms["breaking_point_distance"]
 
     if 10 <= distance2d <= breaking_point_distance:
-        loss = 28.0 + 22 * np.log10(distance3d) + 20 * np.log10(frequency)
+        loss = 28.0 + 22 * np.log10(distance3d) + terms["frequency_loss"]
     elif breaking_point_distance <= distance2d <= 5000:
-        loss = 28.0 + 40 * np.log10(distance3d) + 20 * np.log10(frequency) - 9 * np.log10(
-            np.power(breaking_point_distance, 2) + np.power(tx_height - rx_height, 2))
+        loss = 28.0 + 40 * np.log10(distance3d) + terms["frequency_loss"] - terms["breaking_point_loss"]
     else:
         # Optional loss
-        loss = 32.4 + 20*np.log10(frequency) + 30*np.log10(distance3d)
+        loss = 32.4 + terms["frequency_loss"] + 30*np.log10(distance3d)
         return loss
 
     if line_of_sight == 'los':
         return round(loss, 2)
     else:
-        loss_nlos = 13.54 + 39.08 * np.log10(distance3d) + 20 * np.log10(frequency) - 0.6 * (rx_height - 1.5)
+        loss_nlos = 13.54 + 39.08 * np.log10(distance3d) + terms["frequency_loss"] - 0.6 * (rx_height - 1.5)
         if 10 <= distance2d <= 5000:
             loss = max(loss, loss_nlos)
             return round(loss, 2)
         else:
-            loss = 32.4 + 20 * np.log10(frequency) + 30 * np.log10(distance3d)
+            loss = 32.4 + terms["frequency_loss"] + 30 * np.log10(distance3d)
             return round(loss, 2)
 
 
-def etsi_urban_micro_loss(frequency, distance, tx_height, rx_height):
+"""
+Line of sight probabilities of the ETSI TR 38 901 models for arrays of 2D
+distances, same expressions as in the scalar loss functions, limited to 1
+"""
+
+def etsi_urban_macro_los_probability(distance2d, rx_height):
+
+    distance2d, rx_height = _as_float_arrays(distance2d, rx_height)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        c = np.where(rx_height <= 13, 0.0, np.power(((rx_height - 13) / 10), 1.5))
+        los_probability = (18 / distance2d) + np.exp((-distance2d / 63) * (1 - (18 / distance2d))) * (
+                1 + c * (5 / 4) * np.power(distance2d / 100, 3) * np.exp(-distance2d / 150))
+    return np.where(distance2d <= 18, 1.0, np.minimum(los_probability, 1.0))
+
+
+def etsi_urban_micro_los_probability(distance2d):
+
+    distance2d = np.asarray(distance2d, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        los_probability = (18 / distance2d) + np.exp((-distance2d / 36) * (1 - (18 / distance2d)))
+    return np.where(distance2d <= 18, 1.0, np.minimum(los_probability, 1.0))
+
+
+def etsi_rural_macro_los_probability(distance2d):
+
+    distance2d = np.asarray(distance2d, dtype=float)
+    with np.errstate(over="ignore"):
+        los_probability = np.exp(-1 * (distance2d - 10) / 1000)
+    return np.where(distance2d <= 10, 1.0, np.minimum(los_probability, 1.0))
+
+
+"""
+Array versions of the ETSI TR 38 901 path loss functions
+
+Distance and receiver height may be arrays, branches are selected with masks
+and values match the scalar functions element by element. Elements for which
+the scalar function returns None are NaN.
+
+Line of sight is assumed where its probability is at least 0.5, as in the scalar
+functions, unless line_of_sight is given as a boolean or a boolean array.
+"""
+
+def etsi_urban_macro_loss_array(frequency, distance, tx_height, rx_height, terms=None, line_of_sight=None):
+
+    distance2d, rx_height = _as_float_arrays(distance, rx_height)
+    if terms is None:
+        terms = etsi_urban_macro_terms(frequency, tx_height, rx_height)
+    distance3d = np.sqrt(np.power(distance2d, 2) + np.power((tx_height - rx_height), 2))
+    if line_of_sight is None:
+        line_of_sight = etsi_urban_macro_los_probability(distance2d, rx_height) >= 0.5
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        breaking_point_distance = terms["breaking_point_distance"]
+        before_breaking_point = (10 <= distance2d) & (distance2d <= breaking_point_distance)
+        after_breaking_point = ~before_breaking_point & (breaking_point_distance <= distance2d) & (distance2d <= 5000)
+        optional = ~(before_breaking_point | after_breaking_point)
+
+        log_distance3d = np.log10(distance3d)
+        loss = np.where(
+            before_breaking_point,
+            28.0 + 22 * log_distance3d + terms["frequency_loss"],
+            28.0 + 40 * log_distance3d + terms["frequency_loss"] - terms["breaking_point_loss"])
+        # Optional loss
+        loss_optional = 32.4 + terms["frequency_loss"] + 30 * log_distance3d
+        loss_nlos = 13.54 + 39.08 * log_distance3d + terms["frequency_loss"] - 0.6 * (rx_height - 1.5)
+
+    in_range = (10 <= distance2d) & (distance2d <= 5000)
+    loss = np.where(line_of_sight, loss, np.where(in_range, np.maximum(loss, loss_nlos), loss_optional))
+    return np.where(optional, loss_optional, np.round(loss, 2))
+
+
+def etsi_urban_micro_loss(frequency, distance, tx_height, rx_height, terms=None):
+
+    if terms is None:
+        terms = etsi_urban_micro_terms(frequency, tx_height, rx_height)
 
     distance2d = distance
     distance3d = np.sqrt(np.power(distance2d, 2) + np.power((tx_height - rx_height), 2))
@@ -199,33 +520,62 @@ def etsi_urban_micro_loss(frequency, distance, tx_height, rx_height):
         else:
             line_of_sight = 'nlos'
 
-    effective_environment_height = 1.0
-    breaking_point_distance = 4 * (tx_height - effective_environment_height) * (rx_height - effective_environment_height) * (
-                frequency * 10e9) / 3e8  # Frequency in Hz
+    breaking_point_distance = terms["breaking_point_distance"]
 
     if 10 <= distance2d <= breaking_point_distance:
-        loss = 32.4 + 21 * np.log10(distance3d) + 20 * np.log10(frequency)
+        loss = 32.4 + 21 * np.log10(distance3d) + terms["frequency_loss"]
     elif breaking_point_distance <= distance2d <= 5000:
-        loss = 32.4 + 40 * np.log10(distance3d) + 20 * np.log10(frequency) - 9.5 * np.log10(
-            np.power(breaking_point_distance, 2) + np.power(tx_height - rx_height, 2))
+        loss = 32.4 + 40 * np.log10(distance3d) + terms["frequency_loss"] - terms["breaking_point_loss"]
     else:
         # Optional loss
-        loss = 32.4 + 20 * np.log10(frequency) + 31.9 * np.log10(distance3d)
+        loss = 32.4 + terms["frequency_loss"] + 31.9 * np.log10(distance3d)
         return loss
 
     if line_of_sight == 'los':
         return round(loss, 2)
     else:
-        loss_nlos = 35.3 * np.log10(distance3d) + 22.4 + 21.3 * np.log10(frequency) - 0.3 * (rx_height - 1.5)
+        loss_nlos = 35.3 * np.log10(distance3d) + 22.4 + terms["frequency_loss_nlos"] - 0.3 * (rx_height - 1.5)
         if 10 <= distance2d <= 5000:
             loss = max(loss, loss_nlos)
             return round(loss, 2)
         else:
-            loss = 32.4 + 20 * np.log10(frequency) + 31.9 * np.log10(distance3d)
+            loss = 32.4 + terms["frequency_loss"] + 31.9 * np.log10(distance3d)
             return round(loss, 2)
 
 
-def etsi_rural_macro_loss(frequency, distance, tx_height, rx_height, avg_building_height, avg_street_width):
+def etsi_urban_micro_loss_array(frequency, distance, tx_height, rx_height, terms=None, line_of_sight=None):
+
+    distance2d, rx_height = _as_float_arrays(distance, rx_height)
+    if terms is None:
+        terms = etsi_urban_micro_terms(frequency, tx_height, rx_height)
+    distance3d = np.sqrt(np.power(distance2d, 2) + np.power((tx_height - rx_height), 2))
+    if line_of_sight is None:
+        line_of_sight = etsi_urban_micro_los_probability(distance2d) >= 0.5
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        breaking_point_distance = terms["breaking_point_distance"]
+        before_breaking_point = (10 <= distance2d) & (distance2d <= breaking_point_distance)
+        after_breaking_point = ~before_breaking_point & (breaking_point_distance <= distance2d) & (distance2d <= 5000)
+        optional = ~(before_breaking_point | after_breaking_point)
+
+        log_distance3d = np.log10(distance3d)
+        loss = np.where(
+            before_breaking_point,
+            32.4 + 21 * log_distance3d + terms["frequency_loss"],
+            32.4 + 40 * log_distance3d + terms["frequency_loss"] - terms["breaking_point_loss"])
+        # Optional loss
+        loss_optional = 32.4 + terms["frequency_loss"] + 31.9 * log_distance3d
+        loss_nlos = 35.3 * log_distance3d + 22.4 + terms["frequency_loss_nlos"] - 0.3 * (rx_height - 1.5)
+
+    in_range = (10 <= distance2d) & (distance2d <= 5000)
+    loss = np.where(line_of_sight, loss, np.where(in_range, np.maximum(loss, loss_nlos), loss_optional))
+    return np.where(optional, loss_optional, np.round(loss, 2))
+
+
+def etsi_rural_macro_loss(frequency, distance, tx_height, rx_height, avg_building_height, avg_street_width, terms=None):
+
+    if terms is None:
+        terms = etsi_rural_macro_terms(frequency, tx_height, rx_height, avg_building_height, avg_street_width)
 
     distance2d = distance
     distance3d = np.sqrt(np.power(distance2d, 2) + np.power((tx_height - rx_height), 2))
@@ -238,28 +588,52 @@ def etsi_rural_macro_loss(frequency, distance, tx_height, rx_height, avg_buildin
         else:
             line_of_sight = 'nlos'
 
-    breaking_point_distance = 2 * np.pi * tx_height * rx_height * (frequency * 10e9) / 3e8  # Frequency in Hz
+    breaking_point_distance = terms["breaking_point_distance"]
     if 10 <= distance2d <= breaking_point_distance:
-        loss = 20 * np.log10(40 * np.pi * distance3d * frequency / 3) + min(0.03 * np.power(avg_building_height, 1.72),
-                                                                            10) * np.log10(distance3d) - min(
-            0.044 * np.power(avg_building_height, 1.72), 14.77) + 0.002 * np.log10(avg_building_height) * distance3d
+        loss = 20 * np.log10(40 * np.pi * distance3d * frequency / 3) + terms["height_slope"] * np.log10(
+            distance3d) - terms["height_loss"] + terms["height_distance_slope"] * distance3d
     elif breaking_point_distance <= distance2d <= 10000:
-        loss = 20 * np.log10(40 * np.pi * breaking_point_distance * frequency / 3) + min(
-            0.03 * np.power(avg_building_height, 1.72), 10) * np.log10(breaking_point_distance) - min(
-            0.044 * np.power(avg_building_height, 1.72), 14.77) + 0.002 * np.log10(
-            avg_building_height) * breaking_point_distance + 40 * np.log10(distance3d / breaking_point_distance)
+        loss = terms["breaking_point_loss"] + 40 * np.log10(distance3d / breaking_point_distance)
     else:
         loss = None
 
     if line_of_sight == 'los':
         return round(loss, 2)
     else:
-        loss_nlos = 161.04 - 7.1 * np.log10(avg_street_width) + 7.5 * np.log10(avg_building_height) - (
-                    24.37 - 3.7 * np.power(avg_building_height / tx_height, 2)) * np.log10(tx_height) + (
-                    43.42 - 3.1 * np.log10(tx_height)) * (np.log10(distance3d) - 3) + 20 * np.log10(
-                    frequency) - (3.2 * np.power(np.log10(11.75 * rx_height), 2) - 4.97)
+        loss_nlos = terms["constant_loss_nlos"] + terms["distance_slope_nlos"] * (
+                    np.log10(distance3d) - 3) + terms["frequency_loss"] - terms["rx_height_loss_nlos"]
         if 10 <= distance2d <= 5000:
             loss = max(loss, loss_nlos)
             return round(loss, 2)
         else:
             return None
+
+
+def etsi_rural_macro_loss_array(frequency, distance, tx_height, rx_height, avg_building_height, avg_street_width, terms=None, line_of_sight=None):
+
+    distance2d, rx_height = _as_float_arrays(distance, rx_height)
+    if terms is None:
+        terms = etsi_rural_macro_terms(frequency, tx_height, rx_height, avg_building_height, avg_street_width)
+    distance3d = np.sqrt(np.power(distance2d, 2) + np.power((tx_height - rx_height), 2))
+    if line_of_sight is None:
+        line_of_sight = etsi_rural_macro_los_probability(distance2d) >= 0.5
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        breaking_point_distance = terms["breaking_point_distance"]
+        before_breaking_point = (10 <= distance2d) & (distance2d <= breaking_point_distance)
+        after_breaking_point = ~before_breaking_point & (breaking_point_distance <= distance2d) & (distance2d <= 10000)
+
+        log_distance3d = np.log10(distance3d)
+        loss = np.where(
+            before_breaking_point,
+            20 * np.log10(40 * np.pi * distance3d * frequency / 3) + terms["height_slope"] * log_distance3d - terms[
+                "height_loss"] + terms["height_distance_slope"] * distance3d,
+            terms["breaking_point_loss"] + 40 * np.log10(distance3d / breaking_point_distance))
+        loss = np.where(before_breaking_point | after_breaking_point, loss, np.nan)
+
+        loss_nlos = terms["constant_loss_nlos"] + terms["distance_slope_nlos"] * (
+                    log_distance3d - 3) + terms["frequency_loss"] - terms["rx_height_loss_nlos"]
+
+    in_range = (10 <= distance2d) & (distance2d <= 5000)
+    loss = np.where(line_of_sight, loss, np.where(in_range, np.maximum(loss, loss_nlos), np.nan))
+    return np.round(loss, 2)
@@ -0,0 +1,221 @@
+import json
+import threading
+from collections import OrderedDict
+
+import instrumentation
+import numpy as np
+
+"""
+Precomputed path loss lookup tables
+
+Within a study loss models are evaluated many times for the same
+(model, frequency, tx_height, rx_height), only the distance changes.
+A table samples compute_loss_array once on a log-spaced distance grid and
+answers later queries by linear interpolation in log10(distance). Okumura-Hata
+and the ETSI formulas are linear in log10(distance) between breaking points,
+so the grid is refined only around breaking points and discontinuities.
+Interpolation error is estimated when the table is built.
+"""
+
+# Density of the initial distance grid
+SAMPLES_PER_DECADE = 64
+
+# Relative positions in log10(distance) within an interval at which it is checked
+PROBES = np.array([0.25, 0.5, 0.75])
+
+# Default maximum interpolation error in dB
+DEFAULT_TOLERANCE = 0.05
+
+# Distance range in meters of tables used for optional path loss,
+# distances outside of it are computed directly
+OPTIONAL_MIN_DISTANCE = 1.0
+OPTIONAL_MAX_DISTANCE = 100000.0
+
+# Maximum number of tables kept by get_loss_table, least recently used are evicted
+LOSS_TABLE_CACHE_SIZE = 64
+
+_tables = OrderedDict()
+_lock = threading.Lock()
+
+
+"""
+Path loss of one model configuration sampled on a log-spaced distance grid
+"""
+
+class LossTable(object):
+
+    """
+    Class initializer
+
+    Parameters:
+        distances: increasing array of sampled distances in meters
+        losses: path losses in dB at the sampled distances, NaN where the model has no value
+        error: estimated maximum absolute error of lookup in dB
+    """
+    def __init__(self, distances, losses, error):
+        self.distances = np.asarray(distances, dtype=float)
+        self.losses = np.asarray(losses, dtype=float)
+        self.error = float(error)
+        self.min_distance = self.distances[0]
+        self.max_distance = self.distances[-1]
+        self._log_distances = np.log10(self.distances)
+
+    """
+    Builds a table by sampling a loss model on a log-spaced grid. Intervals where
+    interpolation differs from the model by more than tolerance are split
+    at the midpoint until they are within tolerance. Around a discontinuity of the
+    model (a branch change) splitting stops at two adjacent floating point
+    distances, so every distance is interpolated from samples on its own side.
+
+    Parameters:
+        loss_object: loss model returned by loss.get_loss_object
+        frequency: channel frequency in GHz
+        tx_height: transmitter height
+        rx_height: receiver height
+        min_distance, max_distance: distance range in meters, model range by default
+        tolerance: maximum interpolation error in dB
+
+    Returns:
+        table: LossTable
+    """
+    @classmethod
+    def build(cls, loss_object, frequency, tx_height, rx_height, min_distance=None, max_distance=None, tolerance=DEFAULT_TOLERANCE):
+
+        if min_distance is None:
+            min_distance = loss_object.min_distance
+        if max_distance is None:
+            max_distance = loss_object.max_distance
+
+        count = max(int(np.ceil((np.log10(max_distance) - np.log10(min_distance)) * SAMPLES_PER_DECADE)), 1) + 1
+        distances = np.logspace(np.log10(min_distance), np.log10(max_distance), count)
+        distances[0], distances[-1] = min_distance, max_distance
+        losses = loss_object.compute_loss_array(frequency, distances, tx_height, rx_height)
+
+        while True:
+            log_distances = np.log10(distances)
+            # Intervals are checked at a quarter, half and three quarters of their
+            # width, a single point may miss a discontinuity inside the interval
+            probes = log_distances[:-1, np.newaxis] + np.diff(log_distances)[:, np.newaxis] * PROBES
+            exact = loss_object.compute_loss_array(frequency, np.power(10, probes), tx_height, rx_height)
+            with np.errstate(invalid="ignore"):
+                interpolated = np.interp(probes, log_distances, losses)
+            # Lookups are rounded to 2 decimal places as compute_loss
+            difference = np.abs(interpolated - exact) + 0.005
+            # Intervals with a value on only one side are split as well
+            difference[np.isnan(interpolated) != np.isnan(exact)] = np.inf
+            difference[np.isnan(interpolated) & np.isnan(exact)] = 0.0
+            difference = difference.max(axis=1)
+            difference[np.isnan(losses[:-1]) != np.isnan(losses[1:])] = np.inf
+
+            midpoints = np.sqrt(distances[:-1] * distances[1:])
+            wide = (distances[:-1] < midpoints) & (midpoints < distances[1:])
+            split = wide & (difference > tolerance)
+            if not np.any(split):
+                break
+
+            midpoints = midpoints[split]
+            order = np.argsort(np.concatenate((distances, midpoints)), kind="stable")
+            distances = np.concatenate((distances, midpoints))[order]
+            losses = np.concatenate((losses, loss_object.compute_loss_array(frequency, midpoints, tx_height, rx_height)))[order]
+
+        error = difference[wide].max() if np.any(wide) else 0.005
+        if not np.isfinite(error):
+            error = 0.005
+        return cls(distances, losses, error)
+
+    """
+    Returns interpolated path loss in dB for an array of distances,
+    NaN outside of the table range or next to samples without a value
+    """
+    def lookup(self, distance):
+        distance = np.asarray(distance, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            loss = np.interp(np.log10(distance), self._log_distances, self.losses)
+        loss = np.where((self.min_distance <= distance) & (distance <= self.max_distance), loss, np.nan)
+        return np.round(loss, 2)
+
+
+"""
+Returns key identifying a loss model configuration
+"""
+
+def model_key(loss_object):
+    return (type(loss_object).__name__, loss_object.area_type, getattr(loss_object, "city_type", None),
+            getattr(loss_object, "antenna_type", None), getattr(loss_object, "avg_building_height", None),
+            getattr(loss_object, "avg_street_width", None))
+
+
+"""
+Returns table for given loss model and parameters from a bounded LRU cache
+shared by the process, the table is built on first use
+
+Parameters:
+    same as LossTable.build
+"""
+
+def get_loss_table(loss_object, frequency, tx_height, rx_height, min_distance=None, max_distance=None, tolerance=DEFAULT_TOLERANCE):
+
+    if min_distance is None:
+        min_distance = loss_object.min_distance
+    if max_distance is None:
+        max_distance = loss_object.max_distance
+    key = model_key(loss_object) + (frequency, tx_height, rx_height, min_distance, max_distance, tolerance)
+
+    with _lock:
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+            instrumentation.count("loss_table_hits")
+            return table
+
+    instrumentation.count("loss_table_misses")
+    table = LossTable.build(loss_object, frequency, tx_height, rx_height, min_distance, max_distance, tolerance)
+    add_table(key, table)
+    return table
+
+
+"""
+Adds table to the cache, evicting least recently used tables over LOSS_TABLE_CACHE_SIZE
+"""
+
+def add_table(key, table):
+    with _lock:
+        _tables[key] = table
+        _tables.move_to_end(key)
+        while len(_tables) > LOSS_TABLE_CACHE_SIZE:
+            _tables.popitem(last=False)
+
+
+def clear_tables():
+    with _lock:
+        _tables.clear()
+
+
+"""
+Saves all cached tables to a NumPy .npz file for reuse across runs
+"""
+
+def save_tables(path):
+    with _lock:
+        items = list(_tables.items())
+
+    arrays = {"keys": np.array(json.dumps([[list(key), table.error] for key, table in items]))}
+    for i, (key, table) in enumerate(items):
+        arrays["distances_%d" % i] = table.distances
+        arrays["losses_%d" % i] = table.losses
+    np.savez_compressed(path, **arrays)
+
+
+"""
+Loads tables saved by save_tables into the cache
+
+Returns:
+    count: number of loaded tables
+"""
+
+def load_tables(path):
+    with np.load(path) as arrays:
+        entries = json.loads(str(arrays["keys"]))
+        for i, (key, error) in enumerate(entries):
+            add_table(tuple(key), LossTable(arrays["distances_%d" % i], arrays["losses_%d" % i], error))
+    return len(entries)
@@ -0,0 +1,184 @@
+import instrumentation
+import numpy as np
+
+from units import dbm_to_mw, linear_to_db
+
+"""
+Monte Carlo simulation of random line of sight and shadow fading
+
+The deterministic simulator assumes line of sight wherever its probability
+is at least 0.5 and has no shadow fading. Here every trial draws line of sight
+and log-normal shadowing independently for every receiver-site link, from the
+distributions returned by Loss.compute_loss_distribution. Trials are evaluated
+in batches as (trials, receivers, sites) arrays and only per-receiver
+histograms of SINR and received power are kept, so memory use does not grow
+with the number of trials. Percentiles are read from the histograms with
+a resolution of HISTOGRAM_BIN_WIDTH.
+
+Results are reproducible for the same seed, number of trials and receivers.
+"""
+
+# Percentiles returned by default
+PERCENTILES = (5, 50, 95)
+
+# Histogram ranges in dB (SINR) and dBm (received power), values outside
+# are counted in the first or last bin
+SINR_RANGE = (-60.0, 100.0)
+POWER_RANGE = (-200.0, 50.0)
+HISTOGRAM_BIN_WIDTH = 0.1
+
+# Receivers whose histograms are held at a time
+RECEIVER_CHUNK_SIZE = 2048
+
+# Maximum number of trials x receivers x sites values drawn at once
+MAX_BATCH_ELEMENTS = 1 << 22
+
+
+"""
+Runs Monte Carlo trials for the receivers of a simulator, serving antenna
+and interfering sites as in Simulator.run_batch
+
+Parameters:
+    simulator: Simulator with receiver and site coordinates
+    frequency: channel frequency in GHz
+    bandwidth: channel bandwidth in MHz
+    trials: number of trials
+    seed: seed of the NumPy random Generator, or a Generator
+    percentiles: percentiles to return, between 0 and 100
+    shadowing: shadow fading standard deviation in dB for all links,
+               by default that of the loss model, 0 disables shadowing
+
+Returns:
+    results: dict with "distance" to the serving antenna (receivers in model
+             range only, as in run_batch), "sinr" (dB), "capacity" (kbit/s)
+             and "received_power" (dBm) arrays of shape (percentiles, receivers),
+             "mean_capacity" per receiver, and "percentiles", "trials",
+             "frequency", "bandwidth" and "noise"
+"""
+
+@instrumentation.timed("monte_carlo")
+def run_monte_carlo(simulator, frequency, bandwidth, trials=1000, seed=None, percentiles=PERCENTILES, shadowing=None):
+
+    rng = np.random.default_rng(seed)
+    percentiles = np.asarray(percentiles, dtype=float)
+
+    # Receivers out of the serving model range are skipped, as in run_batch
+    distances = simulator.receiver_distances()
+    valid = ~np.isnan(simulator.compute_path_loss_array(frequency, distances[:, 0]))
+    distances = distances[valid]
+    count = len(distances)
+    instrumentation.count("receivers", count)
+
+    noise = simulator.compute_thermal_noise(bandwidth)
+    results = {
+        "distance": distances[:, 0],
+        "sinr": np.empty((len(percentiles), count)),
+        "capacity": np.empty((len(percentiles), count)),
+        "received_power": np.empty((len(percentiles), count)),
+        "mean_capacity": np.empty(count),
+    }
+
+    for start in range(0, count, RECEIVER_CHUNK_SIZE):
+        rows = slice(start, min(start + RECEIVER_CHUNK_SIZE, count))
+        distribution = simulator.get_loss_object(frequency).compute_loss_distribution(
+            frequency, distances[rows], simulator.params["tx_height"], simulator.params["rx_height"])
+        if shadowing is not None:
+            distribution["los_shadowing"] = distribution["nlos_shadowing"] = np.full(distances[rows].shape, float(shadowing))
+
+        sinr_counts, power_counts, capacity_sum = run_trials(simulator, bandwidth, distribution, noise, trials, rng)
+
+        results["sinr"][:, rows] = histogram_percentiles(sinr_counts, SINR_RANGE[0], percentiles)
+        results["received_power"][:, rows] = histogram_percentiles(power_counts, POWER_RANGE[0], percentiles)
+        results["mean_capacity"][rows] = np.round(capacity_sum / trials, 2)
+
+    # Capacity grows with SINR, so its percentiles are those of SINR
+    results["capacity"] = simulator.compute_capacity(bandwidth, np.maximum(results["sinr"], 0))
+    results.update({
+        "percentiles": percentiles,
+        "trials": trials,
+        "frequency": frequency,
+        "bandwidth": bandwidth,
+        "noise": noise,
+    })
+    return results
+
+
+"""
+Draws trials for a chunk of receivers in batches and accumulates histograms
+
+Parameters:
+    distribution: dict returned by Loss.compute_loss_distribution
+                  for the receivers x sites distance matrix of the chunk
+
+Returns:
+    sinr_counts: SINR histograms of shape (receivers, bins)
+    power_counts: received power histograms of shape (receivers, bins)
+    capacity_sum: sum of capacity over trials per receiver
+"""
+
+def run_trials(simulator, bandwidth, distribution, noise, trials, rng):
+
+    receivers, sites = distribution["los_loss"].shape
+    sinr_bins = histogram_bins(SINR_RANGE)
+    power_bins = histogram_bins(POWER_RANGE)
+    sinr_counts = np.zeros((receivers, sinr_bins), dtype=np.int64)
+    power_counts = np.zeros((receivers, power_bins), dtype=np.int64)
+    capacity_sum = np.zeros(receivers)
+    noise_power = dbm_to_mw(noise)
+
+    batch = max(1, MAX_BATCH_ELEMENTS // max(receivers * sites, 1))
+    for start in range(0, trials, batch):
+        size = min(batch, trials - start)
+        with instrumentation.stage("path_loss"):
+            line_of_sight = rng.random((size, receivers, sites)) < distribution["los_probability"]
+            loss = np.where(line_of_sight, distribution["los_loss"], distribution["nlos_loss"])
+            loss += rng.standard_normal((size, receivers, sites)) * np.where(
+                line_of_sight, distribution["los_shadowing"], distribution["nlos_shadowing"])
+
+        with instrumentation.stage("power"):
+            eirp, received_power = simulator.compute_received_power(loss)
+            # Links without a loss value do not contribute
+            power = dbm_to_mw(received_power)
+            power = np.where(np.isnan(power), 0.0, power)
+            signal = power[:, :, 0]
+            sinr = linear_to_db(signal / (noise_power + np.sum(power[:, :, 1:], axis=2)))
+
+            sinr_counts += histogram_counts(sinr, SINR_RANGE[0], sinr_bins)
+            power_counts += histogram_counts(received_power[:, :, 0], POWER_RANGE[0], power_bins)
+            capacity_sum += np.sum(simulator.compute_capacity(bandwidth, np.maximum(sinr, 0)), axis=0)
+
+    instrumentation.count("monte_carlo_trials", trials * receivers)
+    return sinr_counts, power_counts, capacity_sum
+
+
+def histogram_bins(value_range):
+    return int(round((value_range[1] - value_range[0]) / HISTOGRAM_BIN_WIDTH))
+
+
+"""
+Returns per-receiver histograms of values of shape (trials, receivers)
+as counts of shape (receivers, bins)
+"""
+
+def histogram_counts(values, low, bins):
+    trials, receivers = values.shape
+    with np.errstate(invalid="ignore"):
+        index = np.floor((values - low) / HISTOGRAM_BIN_WIDTH)
+    # NaN (no signal) and -inf fall into the first bin
+    index = np.clip(np.nan_to_num(index, nan=0, neginf=0, posinf=bins - 1), 0, bins - 1).astype(np.int64)
+    index += np.arange(receivers) * bins
+    return np.bincount(index.ravel(), minlength=receivers * bins).reshape(receivers, bins)
+
+
+"""
+Returns percentiles of shape (percentiles, receivers) from histograms,
+every value is the centre of the bin holding the percentile
+"""
+
+def histogram_percentiles(counts, low, percentiles):
+    cumulative = np.cumsum(counts, axis=1)
+    totals = cumulative[:, -1:]
+    # Smallest bin holding at least the given share of trials
+    targets = np.maximum(np.ceil(percentiles[:, np.newaxis, np.newaxis] / 100 * totals), 1)
+    bins = np.argmax(cumulative[np.newaxis] >= targets, axis=2)
+    return np.round(low + (bins + 0.5) * HISTOGRAM_BIN_WIDTH, 2)
@@ -0,0 +1,88 @@
+import threading
+
+import instrumentation
+import numpy as np
+
+"""
+Coordinate transformations between geographic coordinates and national grids
+
+Transformers are expensive to create, so they are created once per
+(source, target) pair and reused. pyproj transformers must not be shared
+between threads, each thread keeps its own.
+"""
+
+# Default spatial reference system for GeoJSON: EPSG:4326 (Google Maps, OpenStreetMap...)
+GEOGRAPHIC_CRS = "EPSG:4326"
+
+# Spatial reference system for Croatia (HTRS96/TM), other national grids can be used as well
+DEFAULT_CRS = "EPSG:3765"
+
+# Maximum number of transformers kept per thread
+TRANSFORMER_CACHE_SIZE = 16
+
+_local = threading.local()
+
+
+"""
+Returns cached transformer from source to target CRS, coordinates
+are always in (x, y) order, i.e. (longitude, latitude) for EPSG:4326
+"""
+
+def get_transformer(source, target):
+    transformers = getattr(_local, "transformers", None)
+    if transformers is None:
+        transformers = _local.transformers = {}
+
+    transformer = transformers.get((source, target))
+    if transformer is None:
+        if len(transformers) >= TRANSFORMER_CACHE_SIZE:
+            transformers.clear()
+        # pyproj is imported on first use to keep module import cheap
+        from pyproj import Transformer
+        transformer = Transformer.from_crs(source, target, always_xy=True)
+        transformers[(source, target)] = transformer
+    return transformer
+
+
+"""
+Transforms coordinate arrays from source to target CRS
+
+Parameters:
+    x, y: arrays (or scalars) of coordinates in source CRS
+    source, target: CRS identifiers, e.g. "EPSG:4326"
+
+Returns:
+    x, y: arrays of coordinates in target CRS
+"""
+
+@instrumentation.timed("projection")
+def transform(x, y, source, target):
+    if source == target:
+        return np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    return get_transformer(source, target).transform(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+
+"""
+Transforms an array of coordinates of shape (..., 2) from source to target CRS
+"""
+
+def transform_coordinates(coordinates, source, target):
+    coordinates = np.asarray(coordinates, dtype=float)
+    x, y = transform(coordinates[..., 0], coordinates[..., 1], source, target)
+    return np.stack((x, y), axis=-1)
+
+
+"""
+Projects longitude and latitude to national grid coordinates
+"""
+
+def to_projected(longitude, latitude, crs=DEFAULT_CRS):
+    return transform(longitude, latitude, GEOGRAPHIC_CRS, crs)
+
+
+"""
+Returns longitude and latitude for national grid coordinates
+"""
+
+def to_geographic(x, y, crs=DEFAULT_CRS):
+    return transform(x, y, crs, GEOGRAPHIC_CRS)
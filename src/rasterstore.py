@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import time
+
+import instrumentation
+import numpy as np
+import projection
+
+"""
+On-disk store of coverage rasters for map tiles
+
+Every layer (SINR, capacity, received power...) is a float32 np.memmap
+stored tile-major: the raster is split into square tiles of tile_size pixels
+and the pixels of every tile are contiguous in the file, so reading the data
+behind one map tile touches only a few pages. A JSON sidecar describes the
+raster grid, its CRS and the simulation it holds. Pixels without a value,
+including padding of the last tile row and column, are NaN.
+
+A store is written band by band from Simulator.run_coverage, so rasters
+larger than memory can be built:
+
+    python src/rasterstore.py config.ini Macro-Urban coverage/ --latitude 45.8 --longitude 15.97 --frequency 2 --bandwidth 20
+"""
+
+# Layers written by write_coverage, in the units of Simulator.run_coverage
+LAYERS = ("sinr", "capacity", "received_power", "interference_power", "best_server")
+
+DEFAULT_TILE_SIZE = 256
+
+SIDECAR = "raster.json"
+DTYPE = np.dtype("<f4")
+
+
+"""
+Tiled raster layers backed by memory-mapped files in a directory
+"""
+
+class RasterStore(object):
+
+    """
+    Opens an existing store, see create for new ones
+
+    Parameters:
+        path: store directory
+        mode: "r" to read or "r+" to read and write
+    """
+    def __init__(self, path, mode="r"):
+
+        with open(os.path.join(path, SIDECAR)) as file:
+            self.metadata = json.load(file)
+
+        self.path = path
+        self.mode = mode
+        self.crs = self.metadata["crs"]
+        self.shape = tuple(self.metadata["shape"])
+        self.tile_size = self.metadata["tile_size"]
+        self.tiles = tuple(self.metadata["tiles"])
+        self.layers = tuple(self.metadata["layers"])
+        # Coordinates of the centres of the first and last column and row
+        self.x = tuple(self.metadata["x"])
+        self.y = tuple(self.metadata["y"])
+        self._arrays = {}
+
+    """
+    Creates an empty store with all pixels set to NaN
+
+    Parameters:
+        path: store directory, created if missing
+        shape: raster size as (rows, columns)
+        x: (first, last) x coordinate of pixel centres, west to east
+        y: (first, last) y coordinate of pixel centres, north to south
+        crs: CRS of the coordinates
+        layers: names of layers
+        tile_size: side of tiles in pixels
+        attributes: dict stored in the sidecar, e.g. frequency and bandwidth
+
+    Returns:
+        store: RasterStore opened for writing
+    """
+    @classmethod
+    def create(cls, path, shape, x, y, crs, layers=LAYERS, tile_size=DEFAULT_TILE_SIZE, attributes=None):
+
+        os.makedirs(path, exist_ok=True)
+        tiles = [-(-shape[0] // tile_size), -(-shape[1] // tile_size)]
+        for layer in layers:
+            array = np.memmap(os.path.join(path, layer + ".bin"), dtype=DTYPE, mode="w+",
+                              shape=(tiles[0], tiles[1], tile_size, tile_size))
+            array[:] = np.nan
+            array.flush()
+            del array
+
+        metadata = {
+            "crs": crs,
+            "shape": [int(shape[0]), int(shape[1])],
+            "tile_size": int(tile_size),
+            "tiles": tiles,
+            "x": [float(x[0]), float(x[1])],
+            "y": [float(y[0]), float(y[1])],
+            "layers": list(layers),
+            "dtype": DTYPE.str,
+            "attributes": attributes or {},
+            # Changes whenever the store is rewritten, see web tile caching
+            "created": time.time(),
+        }
+        with open(os.path.join(path, SIDECAR), "w") as file:
+            json.dump(metadata, file, indent=2)
+
+        return cls(path, mode="r+")
+
+    """
+    Returns memory-mapped layer of shape (tile rows, tile columns, tile_size, tile_size)
+    """
+    def layer(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            if name not in self.layers:
+                raise ValueError("Unknown layer: %s" % name)
+            array = np.memmap(os.path.join(self.path, name + ".bin"), dtype=DTYPE, mode=self.mode,
+                              shape=(self.tiles[0], self.tiles[1], self.tile_size, self.tile_size))
+            self._arrays[name] = array
+        return array
+
+    """
+    Writes a 2-D block of values with its top left pixel at (row, column)
+    """
+    def write(self, name, row, column, values):
+        array = self.layer(name)
+        size = self.tile_size
+        rows, columns = values.shape
+
+        for tile_row in range(row // size, (row + rows - 1) // size + 1):
+            top = max(row, tile_row * size)
+            bottom = min(row + rows, (tile_row + 1) * size)
+            for tile_column in range(column // size, (column + columns - 1) // size + 1):
+                left = max(column, tile_column * size)
+                right = min(column + columns, (tile_column + 1) * size)
+                array[tile_row, tile_column, top - tile_row * size:bottom - tile_row * size,
+                      left - tile_column * size:right - tile_column * size] = values[top - row:bottom - row, left - column:right - column]
+
+    """
+    Returns a 2-D block of values of shape (rows, columns) with its top left pixel at (row, column)
+    """
+    def read(self, name, row, column, rows, columns):
+        array = self.layer(name)
+        size = self.tile_size
+        tiles = array[row // size:(row + rows - 1) // size + 1, column // size:(column + columns - 1) // size + 1]
+        # Tile-major to row-major for the covered tiles only
+        block = tiles.transpose(0, 2, 1, 3).reshape(tiles.shape[0] * size, tiles.shape[1] * size)
+        return np.array(block[row % size:row % size + rows, column % size:column % size + columns])
+
+    """
+    Returns values of the pixels nearest to points given in the store CRS,
+    NaN for points outside of the raster
+
+    Parameters:
+        name: layer name
+        x, y: arrays of coordinates of the same shape
+    """
+    def sample(self, name, x, y):
+        array = self.layer(name)
+        rows, columns = self.shape
+        column = np.rint((x - self.x[0]) / self.pixel_size(0)) if columns > 1 else np.zeros(np.shape(x))
+        row = np.rint((y - self.y[0]) / self.pixel_size(1)) if rows > 1 else np.zeros(np.shape(y))
+        inside = (row >= 0) & (row < rows) & (column >= 0) & (column < columns)
+
+        row = row[inside].astype(np.int64)
+        column = column[inside].astype(np.int64)
+        size = self.tile_size
+        index = ((row // size * self.tiles[1] + column // size) * size + row % size) * size + column % size
+
+        values = np.full(np.shape(x), np.nan, dtype=DTYPE)
+        # Sorted indices read the file forward
+        order = np.argsort(index, kind="stable")
+        selected = np.empty(len(index), dtype=DTYPE)
+        selected[order] = array.reshape(-1)[index[order]]
+        values[inside] = selected
+        return values
+
+    """
+    Returns distance between pixel centres along x (axis 0) or y (axis 1),
+    negative along y as rows go from north to south
+    """
+    def pixel_size(self, axis):
+        first, last = (self.x, self.y)[axis]
+        return (last - first) / (self.shape[1 - axis] - 1)
+
+    """
+    Returns (minx, miny, maxx, maxy) of pixel centres in the store CRS
+    """
+    def bounds(self):
+        return min(self.x), min(self.y), max(self.x), max(self.y)
+
+    def flush(self):
+        for array in self._arrays.values():
+            array.flush()
+
+    def close(self):
+        self.flush()
+        self._arrays = {}
+
+
+"""
+Runs Simulator.run_coverage band by band and writes its rasters to a new store,
+only one band of tile rows is held in memory
+
+Parameters:
+    simulator: Simulator with site coordinates
+    frequency: channel frequency in GHz
+    bandwidth: channel bandwidth in MHz
+    path: store directory
+    shape: raster size as (rows, columns)
+    bounds: (minx, miny, maxx, maxy) of pixel centres, bounds of all sites by default
+    crs: CRS of the simulator coordinates
+    tile_size: side of tiles in pixels
+
+Returns:
+    store: RasterStore holding LAYERS
+"""
+
+@instrumentation.timed("raster")
+def write_coverage(simulator, frequency, bandwidth, path, shape, bounds=None, crs=None, tile_size=DEFAULT_TILE_SIZE):
+
+    rows, columns = shape
+    if bounds is None:
+        bounds = simulator.network_bounds()
+    minx, miny, maxx, maxy = bounds
+    y_ax = np.linspace(maxy, miny, num=rows)
+
+    store = RasterStore.create(path, shape, (minx, maxx), (maxy, miny), crs or projection.DEFAULT_CRS,
+                               tile_size=tile_size, attributes={"frequency": frequency, "bandwidth": bandwidth})
+
+    for row in range(0, rows, tile_size):
+        band = y_ax[row:row + tile_size]
+        coverage = simulator.run_coverage(frequency, bandwidth, shape=(len(band), columns),
+                                          bounds=(minx, band[-1], maxx, band[0]))
+        for layer in LAYERS:
+            store.write(layer, row, 0, coverage[layer].astype(DTYPE))
+
+    store.metadata["attributes"]["noise"] = coverage["noise"]
+    with open(os.path.join(path, SIDECAR), "w") as file:
+        json.dump(store.metadata, file, indent=2)
+    store.flush()
+    return store
+
+
+def main(argv=None):
+    from batch import load_profiles
+    from generator import generate_coordinates
+    from simulator import Simulator
+
+    parser = argparse.ArgumentParser(description="Writes a coverage raster store for one config.ini profile")
+    parser.add_argument("config", help="config.ini with one section per profile")
+    parser.add_argument("profile", help="profile to run")
+    parser.add_argument("output", help="store directory")
+    parser.add_argument("--latitude", type=float, required=True, help="latitude of the central site")
+    parser.add_argument("--longitude", type=float, required=True, help="longitude of the central site")
+    parser.add_argument("--frequency", type=float, required=True, help="channel frequency in GHz")
+    parser.add_argument("--bandwidth", type=float, required=True, help="channel bandwidth in MHz")
+    parser.add_argument("--rings", type=int, default=1, help="tiers of interfering sites")
+    parser.add_argument("--size", type=int, nargs=2, default=[2048, 2048], metavar=("ROWS", "COLUMNS"), help="raster size")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE, help="side of stored tiles in pixels")
+    args = parser.parse_args(argv)
+
+    params = load_profiles(args.config, [args.profile])[args.profile]
+    radius = params.pop("radius")
+    data = generate_coordinates((args.latitude, args.longitude), radius, rings=args.rings)
+    write_coverage(Simulator(data, params), args.frequency, args.bandwidth, args.output, tuple(args.size),
+                   crs=data["crs"], tile_size=args.tile_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import matplotlib.pyplot as plt
 
-from generator import *
+from generator import generate_data, export_geojson
 from simulator import Simulator
 
 COORDINATES = (45.801509, 15.971139)
@@ -8,6 +8,7 @@ RADIUS = 4000
 
 
 data = generate_data(COORDINATES, RADIUS)
+export_geojson(data, "data.geojson")
 
 params = {
     "antenna_type": "macro",
@@ -28,7 +29,7 @@ params = {
 }
 
 simulator = Simulator(data, params)
-results = simulator.run(frequency=2, bandwidth=20.0)
+results = simulator.run_batch(frequency=2, bandwidth=20.0)
 
 plt.plot(results["distance"], results["sinr"])
 plt.show()
\ No newline at end of file
@@ -0,0 +1,171 @@
+import instrumentation
+import numpy as np
+
+from simulator import Simulator
+from units import dbm_to_mw, mw_to_dbm, linear_to_db
+
+"""
+Simulation sessions for interactive planning
+
+A session keeps the received power of every site at every receiver
+(a receivers x sites matrix in mW) between calls. When parameters of one
+site change only its column is recomputed, and best server, total power
+and with them interference, SINR and capacity are updated for the affected
+receivers. As in Simulator.run_coverage every receiver is served by the
+site with the strongest received power and all other sites interfere.
+
+    session = SimulationSession(data, params, frequency=2, bandwidth=20)
+    session.update_site(3, {"tx_power": 40.0})
+    results = session.results()
+"""
+
+# Parameters which may differ between sites, all others are shared
+SITE_PARAMS = ("tx_power", "tx_gain", "tx_losses", "tx_height")
+
+
+class SimulationSession(object):
+
+    """
+    Class initializer
+
+    Parameters:
+        data: dict returned by generator.generate_data or generator.generate_coordinates
+        params: simulation parameters shared by all sites, see Simulator
+        frequency: channel frequency in GHz
+        bandwidth: channel bandwidth in MHz
+        site_params: optional list of dicts with SITE_PARAMS overrides, one per site
+                     from the central antenna on, sites without an entry use params
+    """
+    def __init__(self, data, params, frequency, bandwidth, site_params=None):
+
+        self.simulator = Simulator(data, params)
+        self.params = params
+        self.frequency = frequency
+        self.bandwidth = bandwidth
+
+        self.distances = self.simulator.receiver_distances()
+        count = self.distances.shape[1]
+        self.site_params = [dict(params) for _ in range(count)]
+        if site_params is None:
+            site_params = []
+        if not isinstance(site_params, list):
+            raise ValueError("Site parameters must be a list")
+        if len(site_params) > count:
+            raise ValueError("Site parameters given for %d sites, network has %d" % (len(site_params), count))
+        for site, overrides in enumerate(site_params):
+            self.site_params[site].update(self.check_params(overrides))
+
+        self.noise = self.simulator.compute_thermal_noise(bandwidth)
+        self.noise_power = dbm_to_mw(self.noise)
+
+        self.power = np.column_stack([self.compute_site_power(site) for site in range(count)])
+        self.total_power = np.sum(self.power, axis=1)
+        self.best_server = np.argmax(self.power, axis=1)
+        self.best_power = self.power[np.arange(len(self.power)), self.best_server]
+
+    """
+    Returns overrides checked against SITE_PARAMS, values as floats
+    """
+    def check_params(self, overrides):
+        if not isinstance(overrides, dict):
+            raise ValueError("Site parameters must be a dict")
+        unknown = set(overrides) - set(SITE_PARAMS)
+        if unknown:
+            raise ValueError("Unknown site parameters: %s" % ", ".join(sorted(unknown)))
+        try:
+            return {key: float(value) for key, value in overrides.items()}
+        except (TypeError, ValueError):
+            raise ValueError("Site parameters must be numbers")
+
+    """
+    Returns received power in mW of one site at every receiver,
+    zero where the loss model has no value
+    """
+    def compute_site_power(self, site):
+        simulator = Simulator({"site_coordinates": self.simulator.site_coordinates()}, self.site_params[site])
+        loss = simulator.compute_path_loss_optional_array(self.frequency, self.distances[:, site])
+        eirp, received_power = simulator.compute_received_power(loss)
+        power = dbm_to_mw(received_power)
+        return np.where(np.isnan(power), 0.0, power)
+
+    """
+    Changes parameters of one site and updates results incrementally
+
+    Parameters:
+        site: site index, 0 is the central antenna
+        changes: dict of new values of SITE_PARAMS, e.g. {"tx_power": 43.0}
+
+    Returns:
+        changed: indices of receivers whose received power from the site changed
+    """
+    @instrumentation.timed("simulate")
+    def update_site(self, site, changes):
+
+        self.site_params[site].update(self.check_params(changes))
+        instrumentation.count("receivers", len(self.power))
+
+        old = self.power[:, site].copy()
+        new = self.compute_site_power(site)
+        self.power[:, site] = new
+        changed = np.flatnonzero(old != new)
+        if not len(changed):
+            return changed
+
+        old, new = old[changed], new[changed]
+        served = self.best_server[changed] == site
+
+        # Where the site was the best server it can hold most of the total power,
+        # those sums are recomputed instead of updated to avoid cancellation
+        rows = changed[served]
+        self.total_power[rows] = np.sum(self.power[rows], axis=1)
+        rows = changed[~served]
+        self.total_power[rows] += new[~served] - old[~served]
+
+        # A weaker best server may be overtaken by any other site
+        weaker = changed[served & (new < old)]
+        self.best_server[weaker] = np.argmax(self.power[weaker], axis=1)
+        self.best_power[weaker] = self.power[weaker, self.best_server[weaker]]
+        stronger = changed[served & (new >= old)]
+        self.best_power[stronger] = self.power[stronger, site]
+
+        # Elsewhere the site can only take over receivers it now serves best
+        overtaken = changed[~served & (new > self.best_power[changed])]
+        self.best_server[overtaken] = site
+        self.best_power[overtaken] = self.power[overtaken, site]
+
+        return changed
+
+    """
+    Returns current parameters of a site
+    """
+    def get_site(self, site):
+        return {key: self.site_params[site][key] for key in SITE_PARAMS}
+
+    """
+    Returns results for all receivers as a dict of NumPy arrays
+
+    Returns:
+        results: "best_server" (site index) and "distance" to it, "received_power",
+                 "interference_power" (dBm), "snr", "sinr" (dB), "capacity" (kbit/s),
+                 with "frequency", "bandwidth" and "noise" repeated for every receiver
+    """
+    @instrumentation.timed("power")
+    def results(self):
+
+        count = len(self.power)
+        interference = np.maximum(self.total_power - self.best_power, 0.0)
+        received_power = np.round(mw_to_dbm(self.best_power), 2)
+        sinr = np.round(linear_to_db(self.best_power / (self.noise_power + interference)), 2)
+
+        return {
+            "frequency": np.full(count, self.frequency),
+            "bandwidth": np.full(count, self.bandwidth),
+            "best_server": self.best_server.copy(),
+            "distance": self.distances[np.arange(count), self.best_server],
+            "received_power": received_power,
+            "noise": np.full(count, self.noise),
+            "snr": self.simulator.compute_snr(received_power, self.noise),
+            "capacity": self.simulator.compute_capacity(self.bandwidth, np.maximum(sinr, 0)),
+            "interference_power": np.round(mw_to_dbm(interference), 2),
+            "sinr": sinr
+        }
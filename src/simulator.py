@@ -1,19 +1,61 @@
+import hexcover
+import instrumentation
+import losstable
 import numpy as np
 
-from loss import get_loss_object
+from loss import get_cached_loss_object
+from spatial import SiteIndex, distance_matrix
+from units import dbm_to_mw, mw_to_dbm, linear_to_db, sum_dbm
+
+
+# Loss bounds of pruned interferers are sampled on a log-spaced grid up to this distance
+LOSS_FLOOR_MAX_DISTANCE = 1000000.0
+LOSS_FLOOR_SAMPLES = 385
 
 
 class Simulator(object):
 
+    """
+    Class initializer
+
+    Parameters:
+        data: dict returned by generator.generate_data, or a dict holding only
+              "site_coordinates" (serving antenna first) and "receiver_coordinates"
+              NumPy arrays for the array based methods, as returned by
+              generator.generate_coordinates
+        params: simulation parameters
+    """
     def __init__(self, data, params):
 
-        self.antenna = data["antenna"]
-        self.sites = data["sites"]
-        self.centroids = data["centroids"]
-        self.receivers = data["receivers"]
+        self.antenna = data.get("antenna")
+        self.sites = data.get("sites")
+        self.centroids = data.get("centroids")
+        self.receivers = data.get("receivers")
+        self.receiver_coordinates = data.get("receiver_coordinates")
+        self._site_coordinates = data.get("site_coordinates")
+        self.radius = data.get("radius")
 
         self.params = params
 
+        # Maximum error in dB of path loss lookup tables used by the array
+        # based methods, losses are computed directly if not set
+        self.loss_table_tolerance = params.get("loss_table_tolerance")
+
+        # Interferer pruning for the array based methods, at most one is set:
+        # only the interference_sites nearest interfering sites are evaluated, or
+        # only sites whose received power can reach interference_threshold times
+        # the thermal noise. All interfering sites are evaluated by default.
+        self.interference_sites = params.get("interference_sites")
+        self.interference_threshold = params.get("interference_threshold")
+        self._site_index = None
+        self._loss_floors = {}
+        self._pruning = None
+        self.pruning_error = None
+
+        # Receivers x sites distance matrix, geometry does not change between runs
+        self._distances = None
+
+    @instrumentation.timed("simulate")
     def run(self, frequency, bandwidth):
 
         results = {
@@ -30,6 +72,7 @@ class Simulator(object):
             "sinr": []
         }
 
+        instrumentation.count("receivers", len(self.receivers))
         for receiver in self.receivers:
 
             distance = round(self.antenna.distance(receiver), 2)
@@ -57,11 +100,395 @@ class Simulator(object):
 
         return results
 
+    """
+    Batched version of run: receiver coordinates are pulled into a NumPy
+    array once and all receivers are evaluated with array operations
+
+    Parameters:
+        frequency: channel frequency in GHz
+        bandwidth: channel bandwidth in MHz
+        columnar: if True, results are returned as a dict of NumPy arrays
+                  instead of a dict of lists
+
+    Returns:
+        results: same keys and values as run
+    """
+    def run_batch(self, frequency, bandwidth, columnar=False):
+
+        distance, loss, interference_loss = self.compute_path_losses(frequency, bandwidth=bandwidth)
+        results = self.compute_batch_results(frequency, bandwidth, distance, loss, interference_loss)
+
+        if columnar:
+            return results
+        return {key: value.tolist() for key, value in results.items()}
+
+    """
+    Streaming version of run_batch for receivers given as chunks of coordinates,
+    e.g. by generator.receiver_chunks. Only one chunk and its results are held
+    in memory at a time and no distance matrix is kept on the simulator.
+    With interferer pruning, pruning_error covers all chunks yielded so far.
+
+    Parameters:
+        frequency: channel frequency in GHz
+        bandwidth: channel bandwidth in MHz
+        chunks: iterable of receiver coordinate arrays of shape (n, 2)
+        columnar: same as in run_batch
+
+    Returns:
+        results: generator of run_batch results, one per chunk
+    """
+    def run_chunks(self, frequency, bandwidth, chunks, columnar=True):
+
+        sites = self.site_coordinates()
+        pruning_error = None
+        for receivers in chunks:
+            if self.prunes_interferers():
+                distance, loss, interference_loss = self.compute_pruned_path_losses(frequency, receivers, bandwidth)
+            else:
+                distances = np.round(distance_matrix(receivers, sites), 2)
+                distance, loss, interference_loss = self.compute_path_losses(frequency, distances)
+            results = self.compute_batch_results(frequency, bandwidth, distance, loss, interference_loss)
+            if self.pruning_error is not None:
+                # Error of all chunks so far, not only of the last one
+                pruning_error = merge_pruning_errors(pruning_error, self.pruning_error)
+                self.pruning_error = pruning_error
+
+            if columnar:
+                yield results
+            else:
+                yield {key: value.tolist() for key, value in results.items()}
+
+    """
+    First stage of run_batch: path losses to the serving antenna and to the
+    interfering sites. Losses depend only on geometry, frequency and antenna
+    heights, so they can be reused for other powers, gains and bandwidths.
+
+    Parameters:
+        frequency: channel frequency in GHz
+        distances: receivers x sites distance matrix, receiver_distances by default
+        bandwidth: channel bandwidth in MHz, needed only for interference_threshold
+
+    Returns:
+        distance: distance to the serving antenna for receivers in model range
+        loss: serving path loss in dB for the same receivers
+        interference_loss: matrix of path losses to interfering sites in dB
+    """
+    @instrumentation.timed("path_loss")
+    def compute_path_losses(self, frequency, distances=None, bandwidth=None):
+
+        if distances is None:
+            if self.prunes_interferers():
+                return self.compute_pruned_path_losses(frequency, self.coordinates(), bandwidth)
+            distances = self.receiver_distances()
+        # Nothing is pruned, pruning data of an earlier call does not apply
+        self._pruning = None
+        self.pruning_error = None
+        instrumentation.count("receivers", len(distances))
+        distance = distances[:, 0]
+        loss = self.compute_path_loss_array(frequency, distance)
+
+        # Receivers outside of the model distance range are skipped, as in run
+        valid = ~np.isnan(loss)
+        interference_loss = self.compute_path_loss_optional_array(frequency, distances[valid, 1:])
+
+        return distance[valid], loss[valid], interference_loss
+
+    """
+    Second stage of run_batch: results for path losses
+    returned by compute_path_losses as a dict of NumPy arrays
+    """
+    @instrumentation.timed("power")
+    def compute_batch_results(self, frequency, bandwidth, distance, loss, interference_loss):
+
+        count = len(distance)
+
+        eirp, received_power = self.compute_received_power(loss)
+        noise = self.compute_thermal_noise(bandwidth)
+        snr = self.compute_snr(received_power, noise)
+        capacity = self.compute_capacity(bandwidth, snr)
+        interference_power = self.compute_interference_array(interference_loss)
+        sinr = self.compute_sinr(received_power, noise, interference_power)
+        if self._pruning is not None:
+            self.pruning_error = self.compute_pruning_error(noise, interference_power)
+
+        return {
+            "frequency": np.full(count, frequency),
+            "bandwidth": np.full(count, bandwidth),
+            "distance": distance,
+            "loss": loss,
+            "eirp": np.full(count, eirp),
+            "received_power": received_power,
+            "noise": np.full(count, noise),
+            "snr": snr,
+            "capacity": capacity,
+            "interference_power": interference_power,
+            "sinr": sinr
+        }
+
+    """
+    Returns True if interferers are pruned, see interference_sites
+    and interference_threshold in the initializer
+    """
+    def prunes_interferers(self):
+        return self.interference_sites is not None or self.interference_threshold is not None
+
+    """
+    Same as compute_path_losses, but path losses to interfering sites are
+    computed only for sites kept by interference_sites or interference_threshold,
+    found with a spatial index. Number of pruned sites and a lower bound of their
+    path loss are kept per receiver for compute_pruning_error.
+
+    Parameters:
+        frequency: channel frequency in GHz
+        receivers: receiver coordinates of shape (n, 2)
+        bandwidth: channel bandwidth in MHz, needed only for interference_threshold
+
+    Returns:
+        same as compute_path_losses, interference_loss has one column per
+        kept site, NaN where a receiver keeps fewer sites
+    """
+    def compute_pruned_path_losses(self, frequency, receivers, bandwidth=None):
+
+        sites = self.site_coordinates()
+        distance = np.round(distance_matrix(receivers, sites[:1])[:, 0], 2)
+        loss = self.compute_path_loss_array(frequency, distance)
+        instrumentation.count("receivers", len(distance))
+
+        valid = ~np.isnan(loss)
+        receivers = receivers[valid]
+        interferers = len(sites) - 1
+
+        if self.interference_sites is not None:
+            # The k+1-th nearest site is the closest of the pruned ones
+            count = min(int(self.interference_sites), interferers)
+            indices, distances = self.site_index().nearest(receivers, count + 1)
+            kept, cutoff = distances[:, :count], distances[:, count]
+        else:
+            if bandwidth is None:
+                raise ValueError("Bandwidth is needed for interference_threshold")
+            radius = self.interference_radius(frequency, bandwidth)
+            extent = np.ptp(np.vstack((receivers, sites)), axis=0)
+            if radius >= np.hypot(extent[0], extent[1]):
+                # Radius reaches every site from every receiver, nothing to prune
+                kept = distance_matrix(receivers, sites[1:])
+            else:
+                indices, kept = self.site_index().within(receivers, radius)
+            cutoff = np.full(len(receivers), radius)
+
+        found = np.isfinite(kept)
+        pruned = interferers - np.sum(found, axis=1)
+        interference_loss = self.compute_path_loss_optional_array(frequency, np.round(np.where(found, kept, np.nan), 2))
+
+        self._pruning = (pruned, self.loss_floor(frequency, cutoff))
+        instrumentation.count("interferers_pruned", int(np.sum(pruned)))
+
+        return distance[valid], loss[valid], interference_loss
+
+    """
+    Returns spatial index over interfering sites, built once
+    """
+    def site_index(self):
+        if self._site_index is None:
+            self._site_index = SiteIndex(self.site_coordinates()[1:])
+        return self._site_index
+
+    """
+    Returns a lower bound of path loss in dB to any site at or beyond the
+    given distances, from losses sampled on a log-spaced grid of distances.
+    Distances without a loss value count as infinite loss, as in the sums
+    of interference.
+    """
+    def loss_floor(self, frequency, distance):
+
+        floor = self._loss_floors.get(frequency)
+        if floor is None:
+            grid = np.logspace(0, np.log10(LOSS_FLOOR_MAX_DISTANCE), LOSS_FLOOR_SAMPLES)
+            loss = self.compute_path_loss_optional_array(frequency, grid)
+            loss = np.where(np.isnan(loss), np.inf, loss)
+            floor = self._loss_floors[frequency] = (grid, np.minimum.accumulate(loss[::-1])[::-1])
+
+        grid, floor = floor
+        # The sample at or below the distance bounds the whole interval containing it
+        position = np.clip(np.searchsorted(grid, distance, side="right") - 1, 0, len(grid) - 1)
+        return np.where(np.isfinite(distance), floor[position], np.inf)
+
+    """
+    Returns distance beyond which no site can be received with more than
+    interference_threshold times the thermal noise, inf if there is none
+    """
+    def interference_radius(self, frequency, bandwidth):
+
+        threshold = self.compute_thermal_noise(bandwidth) + linear_to_db(self.interference_threshold)
+        max_loss = self.params["tx_power"] + self.params["tx_gain"] - self.params["tx_losses"] + \
+            self.params["rx_gain"] - self.params["rx_losses"] - threshold
+
+        self.loss_floor(frequency, 1.0)
+        grid, floor = self._loss_floors[frequency]
+        beyond = np.nonzero(floor > max_loss)[0]
+        return grid[beyond[0]] if len(beyond) else np.inf
+
+    """
+    Upper bound of the error introduced by interferer pruning: every pruned site
+    is assumed to be received with the largest power its loss bound allows
+
+    Returns:
+        error: dict with number of receivers, mean number of evaluated and pruned interferers,
+               largest missed interference power in dBm and largest and mean
+               overestimation of SINR in dB
+    """
+    def compute_pruning_error(self, noise, interference_power):
+
+        pruned, floor = self._pruning
+        missed = pruned * dbm_to_mw(self.params["tx_power"] + self.params["tx_gain"] - self.params["tx_losses"] -
+                                    floor + self.params["rx_gain"] - self.params["rx_losses"])
+        interference = dbm_to_mw(np.where(np.isnan(interference_power), -np.inf, interference_power))
+        noise = dbm_to_mw(noise)
+        sinr_error = linear_to_db((noise + interference + missed) / (noise + interference))
+        interferers = len(self.site_coordinates()) - 1
+
+        return {
+            "receivers": len(pruned),
+            "interferers": float(interferers - np.mean(pruned)) if len(pruned) else float(interferers),
+            "pruned": float(np.mean(pruned)) if len(pruned) else 0.0,
+            "max_missed_power": float(mw_to_dbm(np.max(missed))) if len(missed) else float("-inf"),
+            "max_sinr_error": float(np.max(sinr_error)) if len(sinr_error) else 0.0,
+            "mean_sinr_error": float(np.mean(sinr_error)) if len(sinr_error) else 0.0,
+        }
+
+    """
+    Returns receiver coordinates as a NumPy array of shape (n, 2)
+    """
+    def coordinates(self):
+        if self.receiver_coordinates is None:
+            self.receiver_coordinates = point_coordinates(self.receivers)
+        return self.receiver_coordinates
+
+    """
+    Returns matrix of distances between receivers and sites rounded
+    to 2 decimal places, first column is the serving antenna.
+    The matrix is computed once and reused by following runs.
+    """
+    def receiver_distances(self):
+
+        if self._distances is None:
+            instrumentation.count("distance_cache_misses")
+            receivers = self.receiver_coordinates
+            if receivers is None:
+                receivers = point_coordinates(self.receivers)
+            self._distances = np.round(distance_matrix(receivers, self.site_coordinates()), 2)
+        else:
+            instrumentation.count("distance_cache_hits")
+
+        return self._distances
+
+    """
+    Coverage map over the whole network: receivers are placed on a raster
+    covering all sites and every receiver is served by the site with the
+    strongest received power, all other sites are summed as interference
+    in linear power
+
+    Parameters:
+        frequency: channel frequency in GHz
+        bandwidth: channel bandwidth in MHz
+        shape: raster size as (rows, columns) or a single int for a square raster
+        bounds: (minx, miny, maxx, maxy) of the raster, defaults to bounds of all sites
+        chunk_size: number of raster cells evaluated at once, bounds memory use
+
+    Returns:
+        coverage: dict with raster axes "x" and "y" (first row is the northernmost),
+                  2-D rasters "best_server" (site index), "received_power",
+                  "interference_power" (dBm), "sinr" (dB) and "capacity" (kbit/s),
+                  and scalars "frequency", "bandwidth" and "noise"
+    """
+    @instrumentation.timed("coverage")
+    def run_coverage(self, frequency, bandwidth, shape=(200, 200), bounds=None, chunk_size=65536):
+
+        if np.ndim(shape) == 0:
+            shape = (shape, shape)
+        rows, columns = shape
+        if bounds is None:
+            bounds = self.network_bounds()
+        minx, miny, maxx, maxy = bounds
+
+        x_ax = np.linspace(minx, maxx, num=columns)
+        y_ax = np.linspace(maxy, miny, num=rows)
+        sites = self.site_coordinates()
+        noise = self.compute_thermal_noise(bandwidth)
+        noise_power = dbm_to_mw(noise)
+
+        best_server = np.empty(rows * columns, dtype=int)
+        received_power = np.empty(rows * columns)
+        interference_power = np.empty(rows * columns)
+
+        for start in range(0, rows * columns, chunk_size):
+            cells = np.arange(start, min(start + chunk_size, rows * columns))
+            receivers = np.column_stack((x_ax[cells % columns], y_ax[cells // columns]))
+
+            distances = np.round(distance_matrix(receivers, sites), 2)
+            loss = self.compute_path_loss_optional_array(frequency, distances)
+            eirp, power = self.compute_received_power(loss)
+
+            # Sites without a loss value do not contribute
+            power = dbm_to_mw(power)
+            power = np.where(np.isnan(power), 0.0, power)
+            best = np.argmax(power, axis=1)
+            serving = power[np.arange(len(cells)), best]
+            power[np.arange(len(cells)), best] = 0.0
+
+            best_server[cells] = best
+            received_power[cells] = serving
+            interference_power[cells] = np.sum(power, axis=1)
+
+        sinr = np.round(linear_to_db(received_power / (noise_power + interference_power)), 2)
+        received_power = np.round(mw_to_dbm(received_power), 2)
+        interference_power = np.round(mw_to_dbm(interference_power), 2)
+        capacity = self.compute_capacity(bandwidth, np.maximum(sinr, 0))
+
+        return {
+            "frequency": frequency,
+            "bandwidth": bandwidth,
+            "noise": noise,
+            "x": x_ax,
+            "y": y_ax,
+            "best_server": best_server.reshape(shape),
+            "received_power": received_power.reshape(shape),
+            "interference_power": interference_power.reshape(shape),
+            "sinr": sinr.reshape(shape),
+            "capacity": capacity.reshape(shape)
+        }
+
+    """
+    Returns (minx, miny, maxx, maxy) of all sites, computed from site
+    coordinates and cell radius when no site geometry is available
+    """
+    def network_bounds(self):
+        if self.sites is not None:
+            return self.sites.total_bounds
+        vertices = hexcover.hexagon_vertices(self.site_coordinates(), self.radius).reshape(-1, 2)
+        return np.concatenate((vertices.min(axis=0), vertices.max(axis=0)))
+
+    """
+    Returns coordinates of the serving antenna followed by
+    interfering sites as a NumPy array of shape (sites, 2)
+    """
+    def site_coordinates(self):
+        if self._site_coordinates is None:
+            self._site_coordinates = np.vstack(([self.antenna.x, self.antenna.y], point_coordinates(self.centroids[1:])))
+        return self._site_coordinates
+
+    """
+    Returns loss model for given frequency and simulator parameters,
+    loss models are shared through a bounded cache in the loss module
+    """
+    def get_loss_object(self, frequency):
+        return get_cached_loss_object(frequency, self.params["area_type"], self.params["city_type"], self.params["antenna_type"], self.params["avg_building_height"], self.params["avg_street_width"])
+
     """
     Returns path loss in dB
     """
     def compute_path_loss(self, frequency, distance):
-        loss_object = get_loss_object(frequency, self.params["area_type"], self.params["city_type"], self.params["antenna_type"], self.params["avg_building_height"], self.params["avg_street_width"])
+        loss_object = self.get_loss_object(frequency)
+        instrumentation.count("loss_calls")
         if loss_object.min_distance <= distance <= loss_object.max_distance:
             loss = loss_object.compute_loss(frequency, distance, self.params["tx_height"], self.params["rx_height"])
             return loss
@@ -72,10 +499,49 @@ class Simulator(object):
     accuracy for given distance and model is not guaranteed
     """
     def compute_path_loss_optional(self, frequency, distance):
-        loss_object = get_loss_object(frequency, self.params["area_type"], self.params["city_type"], self.params["antenna_type"], self.params["avg_building_height"], self.params["avg_street_width"])
+        loss_object = self.get_loss_object(frequency)
+        instrumentation.count("loss_calls")
         loss = loss_object.compute_loss(frequency, distance, self.params["tx_height"], self.params["rx_height"])
         return loss
 
+    """
+    Returns path loss in dB for an array of distances,
+    NaN where the distance is out of the model range.
+    Interpolated from a lookup table if loss_table_tolerance is set.
+    """
+    def compute_path_loss_array(self, frequency, distance):
+        loss_object = self.get_loss_object(frequency)
+        instrumentation.count("loss_calls")
+        instrumentation.count("loss_evaluations", np.size(distance))
+        if self.loss_table_tolerance is not None:
+            table = losstable.get_loss_table(loss_object, frequency, self.params["tx_height"], self.params["rx_height"],
+                                             tolerance=self.loss_table_tolerance)
+            return table.lookup(distance)
+        loss = loss_object.compute_loss_array(frequency, distance, self.params["tx_height"], self.params["rx_height"])
+        in_range = (loss_object.min_distance <= distance) & (distance <= loss_object.max_distance)
+        return np.where(in_range, loss, np.nan)
+
+    """
+    Optional path loss for an array of distances, distances within
+    OPTIONAL_MIN_DISTANCE..OPTIONAL_MAX_DISTANCE of losstable are interpolated
+    from a lookup table if loss_table_tolerance is set
+    """
+    def compute_path_loss_optional_array(self, frequency, distance):
+        loss_object = self.get_loss_object(frequency)
+        instrumentation.count("loss_calls")
+        instrumentation.count("loss_evaluations", np.size(distance))
+        if self.loss_table_tolerance is None:
+            return loss_object.compute_loss_array(frequency, distance, self.params["tx_height"], self.params["rx_height"])
+
+        table = losstable.get_loss_table(loss_object, frequency, self.params["tx_height"], self.params["rx_height"],
+                                         losstable.OPTIONAL_MIN_DISTANCE, losstable.OPTIONAL_MAX_DISTANCE,
+                                         self.loss_table_tolerance)
+        loss = table.lookup(distance)
+        outside = (distance < table.min_distance) | (distance > table.max_distance)
+        if np.any(outside):
+            loss[outside] = loss_object.compute_loss_array(frequency, distance[outside], self.params["tx_height"], self.params["rx_height"])
+        return loss
+
     """
     Method returns EIRP and received power in dBm
     
@@ -85,7 +551,7 @@ class Simulator(object):
     def compute_received_power(self, path_loss):
         eirp = self.params["tx_power"] + self.params["tx_gain"] - self.params["tx_losses"]
         received_power = eirp - path_loss + self.params["rx_gain"] - self.params["rx_losses"]
-        return round(eirp, 2), round(received_power, 2)
+        return round(eirp, 2), np.round(received_power, 2)
 
 
     """
@@ -100,7 +566,7 @@ class Simulator(object):
         temperature: temperature in K
     """
     def compute_thermal_noise(self, bandwidth, temperature=300):
-        noise = 10 * np.log10(1.38e-23 * temperature * bandwidth * 1e6 / 1e-3)
+        noise = mw_to_dbm(1.38e-23 * temperature * bandwidth * 1e6 / 1e-3)
         return round(noise, 2)
 
     """
@@ -112,8 +578,8 @@ class Simulator(object):
     """
     def compute_snr(self, signal, noise):
         snr = signal - noise
-        snr = max(snr, 0)
-        return round(snr, 2)
+        snr = np.maximum(snr, 0)
+        return np.round(snr, 2)
 
     """
     Returns capacity in kbits/s
@@ -125,8 +591,12 @@ class Simulator(object):
     def compute_capacity(self, bandwidth, snr):
         capacity = bandwidth * 1e6 * np.log2(1 + snr)
         capacity /= 1e3
-        return round(capacity, 2)
+        return np.round(capacity, 2)
 
+    """
+    Returns interference power in dBm: received power
+    from all other sites summed in the linear domain
+    """
     def compute_interference(self, frequency, receiver):
 
         interference = 0.0
@@ -135,17 +605,70 @@ class Simulator(object):
             distance = round(receiver.distance(transmitter), 2)
             loss = self.compute_path_loss_optional(frequency, distance)
             eirp, received_power = self.compute_received_power(loss)
-            interference += received_power
+            interference += dbm_to_mw(received_power)
 
-        return round(interference, 2)
+        return round(mw_to_dbm(interference), 2)
 
+    """
+    Interference for a matrix of path losses between
+    receivers and interfering sites of shape (receivers, sites)
+    """
+    def compute_interference_array(self, loss):
+        eirp, received_power = self.compute_received_power(loss)
+        return np.round(sum_dbm(received_power, axis=1), 2)
+
+    """
+    Returns signal to interference plus noise ratio in dB
+
+    Parameters:
+        signal: received power for receiver in dBm
+        noise: thermal noise in dBm
+        interference: interference power in dBm
+    """
     def compute_sinr(self, signal, noise, interference):
 
-        # dBm to W conversion
-        signal = 0.001 * np.power(10, signal / 10)
-        noise = 0.001 * np.power(10, noise / 10)
-        interference = 0.001 * np.power(10, interference / 10)
+        # dBm to mW conversion, powers are added in the linear domain
+        signal = dbm_to_mw(signal)
+        noise = dbm_to_mw(noise)
+        interference = dbm_to_mw(interference)
+
+        sinr = linear_to_db(signal / (noise + interference))
+
+        return np.round(sinr, 2)
+
+
+"""
+Combines pruning errors of two sets of receivers returned by
+Simulator.compute_pruning_error, first may be None. Maximums are
+the larger of both, means are weighted by number of receivers.
+"""
+
+def merge_pruning_errors(total, error):
+    if total is None:
+        return dict(error)
+
+    receivers = total["receivers"] + error["receivers"]
+    merged = {}
+    for key in error:
+        if key == "receivers":
+            merged[key] = receivers
+        elif key.startswith("max_"):
+            merged[key] = max(total[key], error[key])
+        elif receivers:
+            merged[key] = (total[key] * total["receivers"] + error[key] * error["receivers"]) / receivers
+        else:
+            merged[key] = error[key]
+    return merged
+
+
+"""
+Returns coordinates of shapely points as a NumPy array of shape (n, 2)
+"""
 
-        sinr = 10*np.log10(signal / (noise + interference))
+def point_coordinates(points):
+    try:
+        # GeoSeries exposes vectorized coordinate accessors
+        return np.column_stack((np.asarray(points.x, dtype=float), np.asarray(points.y, dtype=float)))
+    except AttributeError:
+        return np.array([(point.x, point.y) for point in points], dtype=float).reshape(-1, 2)
 
-        return round(sinr, 2)
@@ -0,0 +1,170 @@
+import numpy as np
+
+"""
+Spatial index over site coordinates
+
+Sites are bucketed into a regular grid of square cells. Receivers are
+grouped by the cell they fall in and every group is compared only with
+sites in a block of cells around it, grown until the result is exact.
+"""
+
+
+"""
+Grid bucket index of site coordinates for nearest and radius queries
+"""
+
+class SiteIndex(object):
+
+    """
+    Class initializer
+
+    Parameters:
+        coordinates: site coordinates of shape (sites, 2) in meters
+        cell_size: side of grid cells in meters, by default chosen
+                   so that a cell holds about one site
+    """
+    def __init__(self, coordinates, cell_size=None):
+
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        count = len(self.coordinates)
+
+        if cell_size is None:
+            extent = np.ptp(self.coordinates, axis=0) if count else np.zeros(2)
+            cell_size = np.sqrt(extent[0] * extent[1] / count) if count and extent.min() > 0 else max(extent.max(), 1.0)
+        self.cell_size = float(cell_size)
+        self.origin = self.coordinates.min(axis=0) if count else np.zeros(2)
+
+        cells = self.cells(self.coordinates)
+        self.min_cell = cells.min(axis=0) if count else np.zeros(2, dtype=int)
+        self.max_cell = cells.max(axis=0) if count else np.zeros(2, dtype=int)
+
+        self.buckets = {}
+        for index, cell in enumerate(map(tuple, cells)):
+            self.buckets.setdefault(cell, []).append(index)
+        self.buckets = {cell: np.array(indices) for cell, indices in self.buckets.items()}
+
+    """
+    Returns integer grid cells of points of shape (n, 2)
+    """
+    def cells(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(int)
+
+    """
+    Returns indices of sites in the block of cells within ring cells of cell
+    """
+    def block(self, cell, ring):
+        rows = range(max(cell[0] - ring, self.min_cell[0]), min(cell[0] + ring, self.max_cell[0]) + 1)
+        columns = range(max(cell[1] - ring, self.min_cell[1]), min(cell[1] + ring, self.max_cell[1]) + 1)
+        indices = [self.buckets[(i, j)] for i in rows for j in columns if (i, j) in self.buckets]
+        return np.concatenate(indices) if indices else np.empty(0, dtype=int)
+
+    """
+    Returns True if the block of cells within ring cells of cell covers all sites
+    """
+    def covers(self, cell, ring):
+        return np.all(cell - ring <= self.min_cell) and np.all(cell + ring >= self.max_cell)
+
+    """
+    Returns k nearest sites of every point
+
+    Parameters:
+        points: coordinates of shape (n, 2)
+        k: number of sites
+
+    Returns:
+        indices: site indices of shape (n, k) ordered by distance,
+                 -1 where there are fewer than k sites
+        distances: distances of shape (n, k), inf where indices are -1
+    """
+    def nearest(self, points, k):
+
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        indices = np.full((len(points), k), -1)
+        distances = np.full((len(points), k), np.inf)
+        if k == 0 or not len(self.coordinates):
+            return indices, distances
+
+        for cell, members in self.groups(points):
+            ring = 1
+            while True:
+                candidates = self.block(cell, ring)
+                group_distances = distance_matrix(points[members], self.coordinates[candidates])
+                # Sites outside the block are at least ring cells away from any point of the cell
+                found = min(k, len(candidates))
+                if found:
+                    order = np.argsort(group_distances, axis=1, kind="stable")[:, :found]
+                    nearest = np.take_along_axis(group_distances, order, axis=1)
+                if self.covers(cell, ring) or (found == k and nearest[:, -1].max() <= ring * self.cell_size):
+                    break
+                ring += 1
+
+            if found:
+                indices[members, :found] = candidates[order]
+                distances[members, :found] = nearest
+
+        return indices, distances
+
+    """
+    Returns sites within radius of every point
+
+    Parameters:
+        points: coordinates of shape (n, 2)
+        radius: search radius in meters
+
+    Returns:
+        indices: site indices of shape (n, m) ordered by distance, m is the largest
+                 number of sites found for a point, -1 pads shorter rows
+        distances: distances of shape (n, m), inf where indices are -1
+    """
+    def within(self, points, radius):
+
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if np.isfinite(radius):
+            ring = int(np.ceil(radius / self.cell_size))
+        else:
+            ring = None
+        rows = []
+
+        for cell, members in self.groups(points):
+            # An infinite radius takes every site
+            candidates = self.block(cell, ring) if ring is not None else np.arange(len(self.coordinates))
+            group_distances = distance_matrix(points[members], self.coordinates[candidates])
+            order = np.argsort(group_distances, axis=1, kind="stable")
+            group_distances = np.take_along_axis(group_distances, order, axis=1)
+            inside = group_distances <= radius
+            rows.append((members, np.where(inside, candidates[order], -1), np.where(inside, group_distances, np.inf)))
+
+        width = max([int(np.sum(group[1] >= 0, axis=1).max(initial=0)) for group in rows] + [0])
+        indices = np.full((len(points), width), -1)
+        distances = np.full((len(points), width), np.inf)
+        for members, group_indices, group_distances in rows:
+            columns = min(width, group_indices.shape[1])
+            indices[members, :columns] = group_indices[:, :columns]
+            distances[members, :columns] = group_distances[:, :columns]
+
+        return indices, distances
+
+    """
+    Groups points by grid cell
+
+    Returns:
+        groups: list of (cell, indices of points in the cell)
+    """
+    def groups(self, points):
+        cells = self.cells(points)
+        unique, inverse = np.unique(cells, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+        return [(unique[i], order[bounds[i]:bounds[i + 1]]) for i in range(len(unique))]
+
+
+"""
+Returns matrix of euclidean distances of shape (receivers, sites)
+between two arrays of coordinates of shape (receivers, 2) and (sites, 2)
+"""
+
+def distance_matrix(receivers, sites):
+    dx = sites[np.newaxis, :, 0] - receivers[:, 0, np.newaxis]
+    dy = sites[np.newaxis, :, 1] - receivers[:, 1, np.newaxis]
+    return np.sqrt(dx * dx + dy * dy)
@@ -0,0 +1,132 @@
+import itertools
+
+import numpy as np
+
+from generator import generate_coordinates
+from simulator import Simulator
+
+# Columns of the stacked sweep results
+SWEEP_DTYPE = np.dtype([
+    ("scenario", np.int64),
+    ("radius", np.float64),
+    ("tx_height", np.float64),
+    ("tx_power", np.float64),
+    ("frequency", np.float64),
+    ("bandwidth", np.float64),
+    ("distance", np.float64),
+    ("loss", np.float64),
+    ("eirp", np.float64),
+    ("received_power", np.float64),
+    ("noise", np.float64),
+    ("snr", np.float64),
+    ("capacity", np.float64),
+    ("interference_power", np.float64),
+    ("sinr", np.float64),
+])
+
+
+"""
+Runs the simulator for every combination of radius, frequency,
+transmitter height, transmitter power and bandwidth
+
+Geometry is generated once per radius and path losses are computed once
+per (radius, frequency, tx_height), other parameters only change the
+power budget and reuse them.
+
+Parameters:
+    coordinates: (latitude, longitude) of the antenna
+    params: simulator parameters, swept values override their entries
+    frequencies: channel frequencies in GHz
+    bandwidths: channel bandwidths in MHz
+    radii: cell radii in meters
+    tx_heights: transmitter heights, defaults to params["tx_height"]
+    tx_powers: transmitter powers in dBm, defaults to params["tx_power"]
+    grid, num_receivers, rings: receiver and network layout, see generate_coordinates
+
+Returns:
+    results: NumPy structured array of SWEEP_DTYPE with one row per receiver
+             and scenario. Scenarios are numbered in the order of
+             radius, frequency, tx_height, tx_power and bandwidth.
+"""
+
+def sweep(coordinates, params, frequencies, bandwidths, radii, tx_heights=None, tx_powers=None, grid=False, num_receivers=20, rings=1):
+    tasks = sweep_tasks(coordinates, params, frequencies, bandwidths, radii, tx_heights, tx_powers, grid, num_receivers, rings)
+    return stack_results([run_sweep_task(*task) for task in tasks])
+
+
+"""
+Splits a sweep into independent tasks, one per (radius, frequency, tx_height)
+
+Tasks hold only plain values and NumPy coordinate arrays, so they can be
+sent to worker processes. Arguments are the same as for sweep.
+
+Returns:
+    tasks: generator of argument tuples for run_sweep_task
+"""
+
+def sweep_tasks(coordinates, params, frequencies, bandwidths, radii, tx_heights=None, tx_powers=None, grid=False, num_receivers=20, rings=1):
+
+    if tx_heights is None:
+        tx_heights = [params["tx_height"]]
+    if tx_powers is None:
+        tx_powers = [params["tx_power"]]
+
+    scenario = 0
+
+    for radius in radii:
+        data = generate_coordinates(coordinates, radius, grid=grid, num_receivers=num_receivers, rings=rings)
+        site_coordinates = data["site_coordinates"]
+
+        for frequency, tx_height in itertools.product(frequencies, tx_heights):
+            yield (scenario, radius, frequency, tx_height, tx_powers, bandwidths,
+                   site_coordinates, data["receiver_coordinates"], params)
+            scenario += len(tx_powers) * len(bandwidths)
+
+
+"""
+Runs one sweep task: path losses for given radius, frequency and tx_height
+are computed once and results are evaluated for every tx_power and bandwidth
+
+Returns:
+    results: NumPy structured array of SWEEP_DTYPE
+"""
+
+def run_sweep_task(scenario, radius, frequency, tx_height, tx_powers, bandwidths, site_coordinates, receiver_coordinates, params):
+
+    data = {
+        "site_coordinates": site_coordinates,
+        "receiver_coordinates": receiver_coordinates
+    }
+    # Interferers pruned by interference_threshold are chosen for the
+    # strongest power and lowest noise of the task, so they hold for all
+    simulator = Simulator(data, dict(params, tx_height=tx_height, tx_power=max(tx_powers)))
+    losses = simulator.compute_path_losses(frequency, bandwidth=min(bandwidths))
+
+    blocks = []
+
+    for tx_power, bandwidth in itertools.product(tx_powers, bandwidths):
+        simulator.params = dict(params, tx_height=tx_height, tx_power=tx_power)
+        results = simulator.compute_batch_results(frequency, bandwidth, *losses)
+
+        block = np.empty(len(results["distance"]), dtype=SWEEP_DTYPE)
+        block["scenario"] = scenario
+        block["radius"] = radius
+        block["tx_height"] = tx_height
+        block["tx_power"] = tx_power
+        for key, value in results.items():
+            block[key] = value
+
+        blocks.append(block)
+        scenario += 1
+
+    return stack_results(blocks)
+
+
+"""
+Concatenates sweep result blocks into one structured array
+"""
+
+def stack_results(blocks):
+    if not blocks:
+        return np.empty(0, dtype=SWEEP_DTYPE)
+    return np.concatenate(blocks)
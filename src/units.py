@@ -0,0 +1,62 @@
+import numpy as np
+
+"""
+Unit conversions between logarithmic (dB, dBm) and linear (ratio, mW) domains
+
+All functions accept scalars as well as NumPy arrays of any shape.
+Powers should be summed in the linear domain, sum_dbm does that directly
+for arrays of dBm values.
+"""
+
+# 10^(x/10) evaluated as exp(x * ln(10)/10), cheaper than np.power
+_DB_TO_NEPER = np.log(10) / 10
+
+
+"""
+Returns power in mW for power in dBm
+"""
+
+def dbm_to_mw(power):
+    return np.exp(np.multiply(power, _DB_TO_NEPER))
+
+
+"""
+Returns power in dBm for power in mW, zero power is -inf dBm
+"""
+
+def mw_to_dbm(power):
+    with np.errstate(divide="ignore"):
+        return 10 * np.log10(power)
+
+
+"""
+Returns linear ratio for value in dB
+"""
+
+def db_to_linear(value):
+    return np.exp(np.multiply(value, _DB_TO_NEPER))
+
+
+"""
+Returns value in dB for linear ratio, zero ratio is -inf dB
+"""
+
+def linear_to_db(value):
+    with np.errstate(divide="ignore"):
+        return 10 * np.log10(value)
+
+
+"""
+Sums powers given in dBm in the linear domain
+
+Parameters:
+    powers: array of powers in dBm, NaN values do not contribute
+    axis: axis along which powers are summed, None sums all values
+
+Returns:
+    total: total power in dBm
+"""
+
+def sum_dbm(powers, axis=None):
+    power = dbm_to_mw(powers)
+    return mw_to_dbm(np.sum(np.where(np.isnan(power), 0.0, power), axis=axis))
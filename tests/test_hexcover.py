@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from src import hexcover
+
+
+@pytest.mark.parametrize("rings", [1, 2, 3])
+def test_first_ring_in_coverage_order(rings):
+    centre = hexcover.Centre(473000.25, 5073000.5)
+    coverage = np.array([polygon.exterior.coords[:] for polygon in hexcover.hexagon_coverage(centre, 1000)])
+    network = np.array([polygon.exterior.coords[:] for polygon in hexcover.hexagon_network(centre, 1000, rings)])
+    centres = hexcover.hexagon_centres(centre, 1000, rings)
+
+    assert len(network) == len(centres) == 1 + 3 * rings * (rings + 1)
+    np.testing.assert_array_equal(network[:7], coverage)
+    np.testing.assert_allclose(centres, network[:, :6].mean(axis=1), rtol=0, atol=1e-6)
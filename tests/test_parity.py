@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from src import generator, loss, simulator, units
+
+COORDINATES = (45.801509, 15.971139)
+
+PARAMS = {
+    "antenna_type": "macro",
+    "avg_building_height": 5.0,
+    "avg_street_width": 20.0,
+    "tx_height": 40.0,
+    "rx_height": 1.5,
+    "area_type": "urban",
+    "city_type": "large",
+
+    "tx_power": 46.0,
+    "tx_gain": 18.0,
+    "tx_losses": 2.0,
+
+    "rx_gain": 4.0,
+    "rx_losses": 1.0,
+}
+
+# (frequency, area_type, city_type, antenna_type) of every loss model variant
+LOSS_MODELS = [
+    (0.9, "urban", "large", None),
+    (0.9, "urban", "medium", None),
+    (1.8, "suburban", "small", None),
+    (0.4, "rural", "large", None),
+    (3.5, "urban", None, "macro"),
+    (3.5, "urban", None, "micro"),
+    (2.0, "rural", None, "macro"),
+]
+
+# Spans the model ranges, including distances where a model has no value
+DISTANCES = np.array([10.0, 35.5, 120.0, 500.0, 999.0, 1000.0, 2500.25, 4999.0, 5000.0, 7500.0, 10000.0, 12000.0])
+
+
+@pytest.mark.parametrize("frequency, area_type, city_type, antenna_type", LOSS_MODELS)
+def test_loss_array_matches_scalar(frequency, area_type, city_type, antenna_type):
+    model = loss.get_loss_object(frequency, area_type, city_type, antenna_type, 5.0, 20.0)
+
+    expected = []
+    for distance in DISTANCES:
+        value = model.compute_loss(frequency, distance, 40.0, 1.5)
+        expected.append(np.nan if value is None else value)
+
+    np.testing.assert_allclose(model.compute_loss_array(frequency, DISTANCES, 40.0, 1.5), expected, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("frequency", [0.9, 2.0, 3.5])
+@pytest.mark.parametrize("grid", [False, True])
+def test_run_batch_matches_run(frequency, grid):
+    data = generator.generate_data(COORDINATES, 1000, grid=grid)
+    sim = simulator.Simulator(data, PARAMS)
+
+    expected = sim.run(frequency=frequency, bandwidth=20.0)
+    results = sim.run_batch(frequency=frequency, bandwidth=20.0)
+
+    assert results.keys() == expected.keys()
+    for key in expected:
+        np.testing.assert_allclose(results[key], expected[key], rtol=0, atol=1e-9, err_msg=key)
+
+
+def test_interference_array_matches_per_site_sum():
+    data = generator.generate_data(COORDINATES, 1000, grid=True, rings=2)
+    sim = simulator.Simulator(data, PARAMS)
+    distance, serving_loss, interference_loss = sim.compute_path_losses(2.0)
+    receivers = [receiver for receiver in data["receivers"] if sim.compute_path_loss(2.0, round(sim.antenna.distance(receiver), 2)) is not None]
+    assert len(receivers) == len(interference_loss)
+
+    # Power of every other site converted to mW and added one site at a time
+    expected = []
+    for receiver in receivers:
+        interference = 0.0
+        for transmitter in data["centroids"][1:]:
+            loss = sim.compute_path_loss_optional(2.0, round(receiver.distance(transmitter), 2))
+            if loss is None:
+                continue
+            eirp, received_power = sim.compute_received_power(loss)
+            interference += np.power(10, received_power / 10)
+        expected.append(round(10 * np.log10(interference), 2))
+
+    np.testing.assert_allclose(sim.compute_interference_array(interference_loss), expected, rtol=0, atol=0.01)
+
+
+def test_sum_dbm_matches_per_value_sum():
+    powers = np.random.default_rng(0).uniform(-150.0, 40.0, (50, 7))
+    powers[powers < -140.0] = np.nan
+
+    expected = [10 * np.log10(sum(np.power(10, power / 10) for power in row if not np.isnan(power))) for row in powers]
+
+    np.testing.assert_allclose(units.sum_dbm(powers, axis=1), expected, rtol=1e-12)
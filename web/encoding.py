@@ -0,0 +1,70 @@
+import base64
+import io
+import json
+
+import numpy as np
+
+# Result columns which have the same value for every receiver, sent once
+SCALAR_COLUMNS = ("frequency", "bandwidth", "eirp", "noise")
+
+# Typed columns are sent as little endian float32
+COLUMN_DTYPE = np.dtype("<f4")
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "columnar": "application/json",
+    "npz": "application/octet-stream",
+}
+
+
+def split_columns(results):
+    # Scalars are taken from the first row, empty results have no scalars
+    scalars = {}
+    columns = {}
+    for key, value in results.items():
+        value = np.asarray(value)
+        if key in SCALAR_COLUMNS:
+            if len(value):
+                scalars[key] = float(value[0])
+        else:
+            columns[key] = value.astype(COLUMN_DTYPE)
+    return scalars, columns
+
+
+def encode_array(array, base64_encoded):
+    if not base64_encoded:
+        return array.tolist()
+    return {
+        "dtype": array.dtype.str,
+        "shape": list(array.shape),
+        "data": base64.b64encode(np.ascontiguousarray(array).tobytes()).decode("ascii"),
+    }
+
+
+def to_columnar_json(results, geometry, base64_encoded=False):
+    # Text columns keep float64 values, which are rounded to 2 decimals and
+    # therefore shorter in JSON than their float32 representation
+    scalars, columns = split_columns(results)
+    if not base64_encoded:
+        columns = {key: np.asarray(results[key]) for key in columns}
+
+    return json.dumps({
+        "format": "columnar",
+        "count": len(next(iter(columns.values()))) if columns else 0,
+        "scalars": scalars,
+        "columns": {key: encode_array(value, base64_encoded) for key, value in columns.items()},
+        "geometry": {key: encode_array(np.asarray(value, dtype=COLUMN_DTYPE if base64_encoded else float), base64_encoded)
+                     for key, value in geometry.items()},
+    }, separators=(",", ":"))
+
+
+def to_npz(results, geometry):
+    # Scalars are stored as 0-d arrays, geometry arrays are prefixed with "geometry_"
+    scalars, columns = split_columns(results)
+    arrays = {key: np.asarray(value, dtype=COLUMN_DTYPE) for key, value in scalars.items()}
+    arrays.update(columns)
+    arrays.update({"geometry_" + key: np.asarray(value, dtype=COLUMN_DTYPE) for key, value in geometry.items()})
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
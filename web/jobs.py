@@ -0,0 +1,59 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+
+# Executors are created on first use, one per pool name
+_executors = {}
+_executors_lock = threading.Lock()
+
+# Submitted jobs by id, oldest first
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def get_executor(name):
+    # Separate bounded pools keep long jobs from starving quick requests
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            workers = settings.SIMULATION_POOLS[name]
+            if settings.SIMULATION_EXECUTOR == 'process':
+                executor = ProcessPoolExecutor(max_workers=workers)
+            else:
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='simulation-' + name)
+            _executors[name] = executor
+        return executor
+
+
+def submit(function, scenario, on_result=None):
+    future = get_executor('jobs').submit(function, scenario)
+    if on_result is not None:
+        future.add_done_callback(lambda job: job.exception() is None and on_result(job.result()))
+    return add_job(future)
+
+
+def add_job(future):
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _jobs[job_id] = future
+        # Finished jobs are forgotten first once the limit is reached
+        while len(_jobs) > settings.SIMULATION_MAX_JOBS:
+            finished = next((key for key, job in _jobs.items() if job.done()), None)
+            if finished is None:
+                break
+            del _jobs[finished]
+    return job_id
+
+
+def completed(result):
+    future = Future()
+    future.set_result(result)
+    return add_job(future)
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
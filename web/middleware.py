@@ -0,0 +1,39 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# src modules import each other by top-level name, instrumentation has to be
+# the same module object the simulator reports to. The src package puts its
+# directory on the path.
+import src  # noqa: F401
+import instrumentation
+
+logger = logging.getLogger("web.instrumentation")
+
+
+class InstrumentationMiddleware(object):
+    """
+    Profiles every request when SIMULATION_INSTRUMENTATION is enabled:
+    stage timings are returned in a Server-Timing header and logged with
+    counters to the "web.instrumentation" logger. When disabled, Django
+    drops the middleware at startup and requests are not touched.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SIMULATION_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profiler = instrumentation.Profiler()
+        token = instrumentation.activate(profiler)
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.deactivate(token)
+
+        response["Server-Timing"] = profiler.server_timing()
+        logger.info("%s %s %d %s", request.method, request.path, response.status_code, json.dumps(profiler.as_dict()))
+        return response
@@ -0,0 +1,33 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Open simulation sessions by id, least recently used first
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def add_session(session):
+    session_id = uuid.uuid4().hex
+    with _sessions_lock:
+        _sessions[session_id] = (session, threading.Lock())
+        # Sessions hold receivers x sites matrices, the least recently used are closed
+        while len(_sessions) > settings.SIMULATION_MAX_SESSIONS:
+            _sessions.popitem(last=False)
+    return session_id
+
+
+def get_session(session_id):
+    # Returns (session, lock), updates of one session are serialized by its lock
+    with _sessions_lock:
+        entry = _sessions.get(session_id)
+        if entry is not None:
+            _sessions.move_to_end(session_id)
+        return entry
+
+
+def close_session(session_id):
+    with _sessions_lock:
+        return _sessions.pop(session_id, None) is not None
@@ -19,6 +19,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'web.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +56,68 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Serialized /api/results/ responses, least recently used entries are evicted
+    # Can be switched to FileBasedCache to share results between worker processes
+    'results': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'results',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 256,
+        },
+    },
+    # Rendered /api/tiles/ map tiles, least recently used entries are evicted
+    'tiles': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiles',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2048,
+        },
+    },
+}
+
+# Bounded worker pools for simulations run outside of the request thread:
+# "requests" serves the async results endpoint, "jobs" serves submitted jobs
+SIMULATION_EXECUTOR = 'thread'  # 'thread' or 'process'
+SIMULATION_POOLS = {
+    'requests': 4,
+    'jobs': 2,
+}
+# Maximum number of job results kept for polling
+SIMULATION_MAX_JOBS = 128
+# Maximum number of open /api/sessions/ simulation sessions, each keeps
+# a receivers x sites power matrix in memory
+SIMULATION_MAX_SESSIONS = 32
+# Directory of coverage raster stores served as map tiles, one subdirectory
+# per raster, written by src/rasterstore.py
+SIMULATION_RASTER_DIR = BASE_DIR / 'rasters'
+
+# Per-stage timings and counters of every request in a Server-Timing header
+# and the "web.instrumentation" log, requests may also ask for them in the
+# response body with "timing": true. Off by default, then it costs nothing.
+SIMULATION_INSTRUMENTATION = False
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'web.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -0,0 +1,126 @@
+import os
+import re
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+
+from src import projection
+from src import rasterstore
+
+# Web map tiles are 256 x 256 pixels in Web Mercator (EPSG:3857)
+TILE_SIZE = 256
+MERCATOR_CRS = "EPSG:3857"
+MERCATOR_EXTENT = 20037508.342789244
+
+TILE_FORMATS = {
+    "png": "image/png",
+    "bin": "application/octet-stream",
+}
+
+# Default colour scale limits per layer, capacity limits follow from the bandwidth
+LAYER_RANGES = {
+    "sinr": (-10.0, 30.0),
+    "received_power": (-120.0, -40.0),
+    "interference_power": (-120.0, -40.0),
+}
+
+# Viridis anchors from low to high values
+COLORS = np.array([
+    [68, 1, 84],
+    [59, 82, 139],
+    [33, 145, 140],
+    [94, 201, 98],
+    [253, 231, 37],
+], dtype=float)
+
+# Categorical colours of serving sites
+SERVER_COLORS = np.array([
+    [31, 119, 180], [255, 127, 14], [44, 160, 44], [214, 39, 40], [148, 103, 189],
+    [140, 86, 75], [227, 119, 194], [127, 127, 127], [188, 189, 34], [23, 190, 207],
+], dtype=np.uint8)
+
+RASTER_NAME = re.compile(r"^[\w-]+$")
+
+
+def get_store(name):
+    # Stores are opened once and reopened when their sidecar changes
+    if not RASTER_NAME.match(name):
+        return None
+    path = os.path.join(settings.SIMULATION_RASTER_DIR, name)
+    try:
+        modified = os.stat(os.path.join(path, rasterstore.SIDECAR)).st_mtime_ns
+    except OSError:
+        return None
+    return open_store(path, modified)
+
+
+@lru_cache(maxsize=16)
+def open_store(path, modified):
+    return rasterstore.RasterStore(path)
+
+
+def tile_coordinates(z, x, y):
+    # Web Mercator coordinates of pixel centres, first row is the northernmost
+    size = 2 * MERCATOR_EXTENT / (1 << z)
+    offsets = (np.arange(TILE_SIZE) + 0.5) * size / TILE_SIZE
+    return np.meshgrid(-MERCATOR_EXTENT + x * size + offsets, MERCATOR_EXTENT - y * size - offsets)
+
+
+def tile_outside(store, mercator_x, mercator_y):
+    # Border of the tile in the store CRS, tiles wholly outside of the raster are not sampled
+    border = np.concatenate((np.arange(TILE_SIZE), np.full(TILE_SIZE, TILE_SIZE - 1), np.arange(TILE_SIZE), np.zeros(TILE_SIZE, dtype=int)))
+    rows = np.concatenate((np.zeros(TILE_SIZE, dtype=int), np.arange(TILE_SIZE), np.full(TILE_SIZE, TILE_SIZE - 1), np.arange(TILE_SIZE)))
+    x, y = projection.transform(mercator_x[rows, border], mercator_y[rows, border], MERCATOR_CRS, store.crs)
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not np.all(finite):
+        return False
+    minx, miny, maxx, maxy = store.bounds()
+    return x.max() < minx or x.min() > maxx or y.max() < miny or y.min() > maxy
+
+
+def sample_tile(store, layer, z, x, y):
+    mercator_x, mercator_y = tile_coordinates(z, x, y)
+    if tile_outside(store, mercator_x, mercator_y):
+        return np.full((TILE_SIZE, TILE_SIZE), np.nan, dtype=rasterstore.DTYPE)
+    store_x, store_y = projection.transform(mercator_x, mercator_y, MERCATOR_CRS, store.crs)
+    return store.sample(layer, store_x, store_y)
+
+
+def layer_range(store, layer):
+    if layer == "capacity":
+        # Same formula as Simulator.compute_capacity at the top of the SINR range
+        bandwidth = store.metadata["attributes"].get("bandwidth", 20.0)
+        return 0.0, bandwidth * 1e3 * np.log2(1 + LAYER_RANGES["sinr"][1])
+    return LAYER_RANGES.get(layer, (0.0, 1.0))
+
+
+def colorize(values, layer, low, high):
+    # RGBA image, pixels without a value are transparent
+    image = np.zeros(values.shape + (4,), dtype=np.uint8)
+    valid = ~np.isnan(values)
+    if layer == "best_server":
+        image[valid, :3] = SERVER_COLORS[values[valid].astype(int) % len(SERVER_COLORS)]
+    else:
+        position = np.clip((values[valid] - low) / (high - low), 0, 1) * (len(COLORS) - 1)
+        anchors = np.arange(len(COLORS))
+        for channel in range(3):
+            image[valid, channel] = np.round(np.interp(position, anchors, COLORS[:, channel]))
+    image[valid, 3] = 255
+    return image
+
+
+def render_tile(store, layer, z, x, y, tile_format, low=None, high=None):
+    # "bin" tiles are raw little endian float32 values, 256 rows of 256, north to south
+    values = sample_tile(store, layer, z, x, y)
+    if tile_format == "bin":
+        return values.astype(rasterstore.DTYPE).tobytes()
+
+    default_low, default_high = layer_range(store, layer)
+    image = colorize(values, layer, default_low if low is None else low, default_high if high is None else high)
+    # Pillow is imported on first use to keep module import cheap
+    from PIL import Image
+    buffer = BytesIO()
+    Image.fromarray(image, "RGBA").save(buffer, "PNG")
+    return buffer.getvalue()
@@ -4,4 +4,10 @@ from . import views
 urlpatterns = [
     path('', views.home),
     path('api/results/', views.results),
+    path('api/results/async/', views.results_async),
+    path('api/jobs/', views.job_submit),
+    path('api/jobs/<str:job_id>/', views.job_status),
+    path('api/sessions/', views.session_create),
+    path('api/sessions/<str:session_id>/', views.session_update),
+    path('api/tiles/<str:raster>/<str:layer>/<int:z>/<int:x>/<int:y>.<str:tile_format>', views.tile),
 ]
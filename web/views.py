@@ -1,46 +1,352 @@
+import asyncio
+import contextvars
+import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
 
 from src import generator
+from src import montecarlo
+from src import projection
+from src import session
 from src import simulator
+from src import sweep
+
+from . import encoding
+from . import jobs
+from . import sessions
+from . import tiles
+
+# Same module object as used by the simulator, see middleware
+import instrumentation
+
+# Cache alias for serialized simulation results, see CACHES in settings
+RESULTS_CACHE = "results"
+# Cache alias for rendered map tiles
+TILES_CACHE = "tiles"
 
 
 def home(request):
     return render(request, 'home.html', {})
 
 
+def parse_request(request_data):
+    scenario = {
+        "frequency": float(request_data["frequency"]),
+        "bandwidth": float(request_data["bandwidth"]),
+        "coordinates": [float(coordinate) for coordinate in request_data["coordinates"]],
+        "radius": float(request_data["radius"]),
+        "rings": int(request_data.get("rings", 1)),
+        "crs": str(request_data.get("crs", projection.DEFAULT_CRS)),
+        # Response format: "json" (default), "columnar" or "npz", see encoding
+        "format": parse_format(request_data.get("format", "json")),
+        "base64": bool(request_data.get("base64", False)),
+        "params": {
+            "antenna_type": "macro",
+            "avg_building_height": float(request_data["avg_building_height"]),
+            "avg_street_width": float(request_data["avg_street_width"]),
+            "tx_height": float(request_data["tx_height"]),
+            "rx_height": float(request_data["rx_height"]),
+            "area_type": "urban",
+            "city_type": "large",
+            "tx_power": float(request_data["tx_power"]),
+            "tx_gain": float(request_data["tx_gain"]),
+            "tx_losses": float(request_data["tx_losses"]),
+            "rx_gain": float(request_data["rx_gain"]),
+            "rx_losses": float(request_data["rx_losses"]),
+        },
+    }
+    if "monte_carlo" in request_data:
+        scenario["monte_carlo"] = parse_monte_carlo(request_data["monte_carlo"])
+    return scenario
+
+
+def parse_monte_carlo(values):
+    # Seeded, so equal requests give equal results and can be cached
+    return {
+        "trials": int(values.get("trials", 1000)),
+        "seed": int(values.get("seed", 0)),
+        "percentiles": [float(value) for value in values.get("percentiles", montecarlo.PERCENTILES)],
+    }
+
+
+def parse_format(response_format):
+    if response_format not in encoding.CONTENT_TYPES:
+        raise ValueError("Unknown response format: %s" % response_format)
+    return response_format
+
+
+def cache_key(scenario):
+    # Parsed values are normalized, so equal scenarios hash equally
+    canonical = json.dumps(scenario, sort_keys=True, separators=(",", ":"))
+    return "results:" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def parse_sweep(request_data):
+    # Swept values are lists, missing ones default to the single scenario value
+    scenario = parse_request(request_data)
+    values = request_data["sweep"]
+
+    def floats(key, default):
+        return [float(value) for value in values.get(key, [default])]
+
+    scenario["sweep"] = {
+        "frequencies": floats("frequencies", scenario["frequency"]),
+        "bandwidths": floats("bandwidths", scenario["bandwidth"]),
+        "radii": floats("radii", scenario["radius"]),
+        "tx_heights": floats("tx_heights", scenario["params"]["tx_height"]),
+        "tx_powers": floats("tx_powers", scenario["params"]["tx_power"]),
+    }
+    return scenario
+
+
+def simulate(scenario):
+    data = generator.generate_coordinates(scenario["coordinates"], scenario["radius"], rings=scenario["rings"], crs=scenario["crs"])
+    sim = simulator.Simulator(data, scenario["params"])
+
+    if "monte_carlo" in scenario:
+        return simulate_monte_carlo(sim, scenario)
+    if scenario["format"] == "columnar":
+        results_dict = sim.run_batch(frequency=scenario["frequency"], bandwidth=scenario["bandwidth"], columnar=True)
+        with instrumentation.stage("serialize"):
+            return encoding.to_columnar_json(results_dict, generator.geometry_coordinates(data), scenario["base64"])
+    if scenario["format"] == "npz":
+        results_dict = sim.run_batch(frequency=scenario["frequency"], bandwidth=scenario["bandwidth"], columnar=True)
+        with instrumentation.stage("serialize"):
+            return encoding.to_npz(results_dict, generator.geometry_coordinates(data))
+
+    results_dict = sim.run_batch(frequency=scenario["frequency"], bandwidth=scenario["bandwidth"])
+    with instrumentation.stage("serialize"):
+        results_dict["complete_data"] = generator.export_geojson(data)
+        return json.dumps(results_dict, cls=DjangoJSONEncoder)
+
+
+def simulate_monte_carlo(sim, scenario):
+    values = scenario["monte_carlo"]
+    results_dict = montecarlo.run_monte_carlo(sim, scenario["frequency"], scenario["bandwidth"], trials=values["trials"],
+                                              seed=values["seed"], percentiles=values["percentiles"])
+    with instrumentation.stage("serialize"):
+        return json.dumps({key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in results_dict.items()})
+
+
+def with_timing(content, scenario, request_data):
+    # Timings are added to JSON responses on request, after caching
+    profiler = instrumentation.get_profiler()
+    if not (request_data.get("timing") and profiler.enabled) or content_type(scenario) != "application/json":
+        return content
+    return content[:content.rindex("}")] + ', "timing": ' + json.dumps(profiler.as_dict()) + "}"
+
+
+def content_type(scenario):
+    if "sweep" in scenario or "monte_carlo" in scenario:
+        return "application/json"
+    return encoding.CONTENT_TYPES[scenario["format"]]
+
+
+def simulate_sweep(scenario):
+    values = scenario["sweep"]
+    results_array = sweep.sweep(scenario["coordinates"], scenario["params"], values["frequencies"], values["bandwidths"],
+                                values["radii"], values["tx_heights"], values["tx_powers"], rings=scenario["rings"])
+
+    results_dict = {name: results_array[name].tolist() for name in results_array.dtype.names}
+    return json.dumps(results_dict, cls=DjangoJSONEncoder)
+
+
+def run_scenario(scenario):
+    if "sweep" in scenario:
+        return simulate_sweep(scenario)
+    return simulate(scenario)
+
+
+def run_job(scenario):
+    return run_scenario(scenario), content_type(scenario)
+
+
 def results(request):
     request_data = json.loads(request.body)
-    frequency = float(request_data["frequency"])
-    bandwidth = float(request_data["bandwidth"])
-    coordinates = request_data["coordinates"]
-    radius = float(request_data["radius"])
-
-    params = {
-        "antenna_type": "macro",
-        "avg_building_height": float(request_data["avg_building_height"]),
-        "avg_street_width": float(request_data["avg_street_width"]),
-        "tx_height": float(request_data["tx_height"]),
-        "rx_height": float(request_data["rx_height"]),
-        "area_type": "urban",
-        "city_type": "large",
-        "tx_power": float(request_data["tx_power"]),
-        "tx_gain": float(request_data["tx_gain"]),
-        "tx_losses": float(request_data["tx_losses"]),
-        "rx_gain": float(request_data["rx_gain"]),
-        "rx_losses": float(request_data["rx_losses"]),
-    }
+    try:
+        scenario = parse_request(request_data)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    # Cache holds serialized JSON, a hit skips simulation and encoding
+    cache = caches[RESULTS_CACHE]
+    key = cache_key(scenario)
+    content = cache.get(key)
+    if content is None:
+        instrumentation.count("results_cache_misses")
+        content = simulate(scenario)
+        cache.set(key, content)
+    else:
+        instrumentation.count("results_cache_hits")
+
+    return HttpResponse(with_timing(content, scenario, request_data), content_type=content_type(scenario))
+
+
+async def results_async(request):
+    request_data = json.loads(request.body)
+    try:
+        scenario = parse_request(request_data)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    cache = caches[RESULTS_CACHE]
+    key = cache_key(scenario)
+    content = cache.get(key)
+    if content is None:
+        instrumentation.count("results_cache_misses")
+        # CPU work runs on a bounded pool, the event loop stays free.
+        # Worker threads get the context carrying the active profiler,
+        # contexts cannot be pickled for worker processes.
+        loop = asyncio.get_running_loop()
+        executor = jobs.get_executor('requests')
+        if isinstance(executor, ThreadPoolExecutor):
+            content = await loop.run_in_executor(executor, contextvars.copy_context().run, simulate, scenario)
+        else:
+            content = await loop.run_in_executor(executor, simulate, scenario)
+        cache.set(key, content)
+    else:
+        instrumentation.count("results_cache_hits")
+
+    return HttpResponse(with_timing(content, scenario, request_data), content_type=content_type(scenario))
+
+
+@require_POST
+def job_submit(request):
+    request_data = json.loads(request.body)
+    try:
+        if "sweep" in request_data:
+            scenario = parse_sweep(request_data)
+        else:
+            scenario = parse_request(request_data)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    cache = caches[RESULTS_CACHE]
+    key = cache_key(scenario)
+    content = cache.get(key)
+    if content is not None:
+        # Cached results are fetched from the job status at once
+        job_id = jobs.completed((content, content_type(scenario)))
+        return JsonResponse({"job": job_id, "status": "done"})
+
+    job_id = jobs.submit(run_job, scenario, lambda result: cache.set(key, result[0]))
+    return JsonResponse({"job": job_id, "status": "pending"}, status=202)
+
+
+@require_GET
+def job_status(request, job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return JsonResponse({"job": job_id, "status": "unknown"}, status=404)
+    if job.running():
+        return JsonResponse({"job": job_id, "status": "running"})
+    if not job.done():
+        return JsonResponse({"job": job_id, "status": "pending"})
+
+    error = job.exception()
+    if error is not None:
+        return JsonResponse({"job": job_id, "status": "failed", "error": str(error)}, status=500)
+
+    content, job_content_type = job.result()
+    return HttpResponse(content, content_type=job_content_type)
+
+
+def session_content(session_id, sim_session, changed=None):
+    content = {"session": session_id, "results": {key: value.tolist() for key, value in sim_session.results().items()}}
+    if changed is not None:
+        content["changed"] = changed.tolist()
+    return JsonResponse(content)
+
+
+@require_POST
+def session_create(request):
+    # Scenario as for /api/results/, optionally with "site_params" overrides per site
+    request_data = json.loads(request.body)
+    try:
+        scenario = parse_request(request_data)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    data = generator.generate_coordinates(scenario["coordinates"], scenario["radius"], rings=scenario["rings"], crs=scenario["crs"])
+    try:
+        sim_session = session.SimulationSession(data, scenario["params"], scenario["frequency"], scenario["bandwidth"],
+                                                request_data.get("site_params"))
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    return session_content(sessions.add_session(sim_session), sim_session)
+
+
+@require_http_methods(["POST", "DELETE"])
+def session_update(request, session_id):
+    # POST {"site": 3, "tx_power": 40} changes one site, DELETE closes the session
+    if request.method == "DELETE":
+        closed = sessions.close_session(session_id)
+        return JsonResponse({"session": session_id, "status": "closed" if closed else "unknown"}, status=200 if closed else 404)
+
+    entry = sessions.get_session(session_id)
+    if entry is None:
+        return JsonResponse({"session": session_id, "status": "unknown"}, status=404)
+    sim_session, lock = entry
+
+    changes = json.loads(request.body)
+    if not isinstance(changes, dict):
+        return JsonResponse({"error": "Request must be an object"}, status=400)
+    try:
+        site = int(changes.pop("site"))
+    except KeyError:
+        return JsonResponse({"error": "Missing site"}, status=400)
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Site must be an integer"}, status=400)
+    if not 0 <= site < len(sim_session.site_params):
+        return JsonResponse({"error": "Unknown site: %d" % site}, status=400)
+    with lock:
+        try:
+            changed = sim_session.update_site(site, changes)
+        except ValueError as error:
+            return JsonResponse({"error": str(error)}, status=400)
+        return session_content(session_id, sim_session, changed)
+
 
-    data = generator.generate_data(coordinates, radius)
-    sim = simulator.Simulator(data, params)
-    results_dict = sim.run(frequency=frequency, bandwidth=bandwidth)
+@require_GET
+def tile(request, raster, layer, z, x, y, tile_format):
+    # Tiles of a raster store in SIMULATION_RASTER_DIR, "min" and "max" override the colour scale
+    store = tiles.get_store(raster)
+    if store is None:
+        return JsonResponse({"error": "Unknown raster: %s" % raster}, status=404)
+    if layer not in store.layers or tile_format not in tiles.TILE_FORMATS or not (0 <= x < 1 << z and 0 <= y < 1 << z):
+        return JsonResponse({"error": "Unknown tile"}, status=404)
+    try:
+        low = float(request.GET["min"]) if "min" in request.GET else None
+        high = float(request.GET["max"]) if "max" in request.GET else None
+    except ValueError:
+        return JsonResponse({"error": "min and max must be numbers"}, status=400)
+    if low is not None or high is not None:
+        # Given limits are checked together with the layer default of the other one
+        default_low, default_high = tiles.layer_range(store, layer)
+        scale_low = default_low if low is None else low
+        scale_high = default_high if high is None else high
+        # Also false for NaN limits
+        if not scale_low < scale_high:
+            return JsonResponse({"error": "min must be less than max"}, status=400)
 
-    complete_data = data["sites"].append(data["centroids"]).append(data["receivers"])
-    complete_data.crs = "EPSG:3765"
-    complete_data = complete_data.to_crs("EPSG:4326")
-    complete_data = complete_data.to_json()
-    results_dict["complete_data"] = complete_data
+    # Keys include the store creation time, a rewritten store is rendered again
+    cache = caches[TILES_CACHE]
+    key = "tile:%s:%s:%s:%d:%d:%d:%s:%s:%s" % (raster, store.metadata["created"], layer, z, x, y, tile_format, low, high)
+    content = cache.get(key)
+    if content is None:
+        instrumentation.count("tile_cache_misses")
+        with instrumentation.stage("render"):
+            content = tiles.render_tile(store, layer, z, x, y, tile_format, low, high)
+        cache.set(key, content)
+    else:
+        instrumentation.count("tile_cache_hits")
 
-    return JsonResponse(results_dict, safe=False)
+    return HttpResponse(content, content_type=tiles.TILE_FORMATS[tile_format])